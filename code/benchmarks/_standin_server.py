@@ -0,0 +1,147 @@
+"""
+ベンチマーク用に商品ページの代わりをするローカルのHTTPサーバー
+
+/jp/auction/[ID] に同梱のフィクスチャを返す。
+レイテンシ(平均と揺らぎ)と、404(終了済み)・301(終了後にリダイレクト)・429(レート制限)を
+返す割合を指定できる。
+"""
+
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# 商品ページのパス(ID部分はYahaucSpiderのitem_url_patternsと同じ形)
+ITEM_PATH_PREFIX = "/jp/auction/"
+
+
+class StandInServer:
+    """
+    フィクスチャを返すHTTPサーバーを別スレッドで起動する
+
+    - 404にする商品はIDのハッシュで決める(再試行しても404のまま)
+    - 301(トップページへのリダイレクト)にする商品も同じくIDのハッシュで決める(404とは重ならない)
+    - 429はリクエストごとに乱数で決める(再試行すれば通ることがある)
+    - / はwarm-up用にCookieを付けて200を返す
+    """
+
+    def __init__(
+        self,
+        fixture_path: Path,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        not_found_rate: float = 0.0,
+        redirect_rate: float = 0.0,
+        too_many_requests_rate: float = 0.0,
+        retry_after: float = 0,
+        seed: int = 0,
+    ):
+        self.body = fixture_path.read_bytes()
+        self.latency = latency
+        self.jitter = jitter
+        self.not_found_rate = not_found_rate
+        self.redirect_rate = redirect_rate
+        self.too_many_requests_rate = too_many_requests_rate
+        self.retry_after = retry_after
+        self.status_counts: dict[int, int] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd: ThreadingHTTPServer | None = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def item_url(self, item_id: str) -> str:
+        return f"{self.base_url}{ITEM_PATH_PREFIX}{item_id}"
+
+    def start(self) -> "StandInServer":
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="stand-in-server", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self) -> "StandInServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+    def respond(self, path: str) -> tuple[int, dict[str, str], bytes]:
+        """
+        パスに対するステータスコード・ヘッダー・ボディを返す
+        """
+        if path == "/":
+            return 200, {"Set-Cookie": "B=standin; Path=/; Max-Age=86400"}, b"ok"
+        if not path.startswith(ITEM_PATH_PREFIX):
+            return 404, {}, b"not found"
+
+        delay = self.latency
+        with self._lock:
+            if self.jitter:
+                delay += self._random.uniform(-self.jitter, self.jitter)
+            too_many_requests = self._random.random() < self.too_many_requests_rate
+        time.sleep(max(0.0, delay))
+
+        item_id = path[len(ITEM_PATH_PREFIX):].split("?")[0]
+        if self.is_not_found(item_id):
+            return 404, {}, b"not found"
+        if self.is_redirected(item_id):
+            return 301, {"Location": "/"}, b"moved"
+        if too_many_requests:
+            headers = {}
+            if self.retry_after:
+                headers["Retry-After"] = str(self.retry_after)
+            return 429, headers, b"too many requests"
+        return 200, {"Content-Type": "text/html; charset=utf-8"}, self.body
+
+    def is_not_found(self, item_id: str) -> bool:
+        return _bucket(item_id) < self.not_found_rate * 10000
+
+    def is_redirected(self, item_id: str) -> bool:
+        start = self.not_found_rate * 10000
+        return start <= _bucket(item_id) < start + self.redirect_rate * 10000
+
+    def _count(self, status_code: int) -> None:
+        with self._lock:
+            self.status_counts[status_code] = self.status_counts.get(status_code, 0) + 1
+
+
+def _bucket(item_id: str) -> int:
+    # NOTE: 同じIDは何度アクセスしても同じ結果にする(crc32はプロセスをまたいでも同じ値)
+    return zlib.crc32(item_id.encode()) % 10000
+
+
+def _make_handler(server: StandInServer):
+    class Handler(BaseHTTPRequestHandler):
+        # NOTE: keep-aliveでコネクションを使い回せるようにする
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            status_code, headers, body = server.respond(self.path)
+            server._count(status_code)
+            self.send_response(status_code)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # NOTE: アクセスログで計測結果が埋もれないようにする
+            pass
+
+    return Handler
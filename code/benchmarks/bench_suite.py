@@ -0,0 +1,619 @@
+"""
+抽出処理とクロール全体をオフラインで計測するベンチマークスイート
+
+次の3つを計測し、ベースライン(baseline.json)と比べて遅くなった項目を表示する。
+
+- extract: yahauc.htmlのパースと各_extract_*メソッド
+  (spiders/mercari/mercari.htmlにメルカリのDOMスナップショットがあれば、その抽出も)
+- clean: BaseSpider.clean_html_textを大きな商品説明文で実行
+- e2e: ローカルのHTTPサーバー(フィクスチャを返す)に対してmain()を実行し、
+  入力の読み込みからCSVの出力まで(crawl_urlsを含む)を計測
+- retry: 429を多めに返すサーバーに対して再試行ありでmain()を実行し、
+  429が再試行で回復すること(再試行の回数と失敗した行の数)を確認
+- redirect: 終了した商品を404と301(リダイレクト)で返すサーバーに対してmain()を実行し、
+  どちらもendedの行になること(リダイレクト先のページを商品として読まないこと)を確認
+
+使い方:
+    python benchmarks/bench_suite.py [--sections extract clean e2e] [--save-baseline]
+    python benchmarks/bench_suite.py --e2e-urls 500 --latency-ms 80 --not-found-rate 0.1 --too-many-requests-rate 0.05
+    python benchmarks/bench_suite.py --save-mercari-snapshot https://jp.mercari.com/item/m...
+"""
+
+import argparse
+import contextlib
+import csv
+import functools
+import io
+import json
+import logging
+import multiprocessing
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+# 現在のファイルの親ディレクトリ(code/)をモジュール検索パスに入れる
+code_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(code_dir))
+
+from _standin_server import ITEM_PATH_PREFIX, StandInServer
+from spiders.yahauc.yahauc_spider import YahaucSpider
+from spiders._html_parser import parse_html
+
+try:
+    # NOTE: resourceはUnix系のみ(Windowsではピークメモリを表示しない)
+    import resource
+except ImportError:
+    resource = None
+
+yahauc_fixture_path = code_dir / "spiders" / "yahauc" / "yahauc.html"
+mercari_fixture_path = code_dir / "spiders" / "mercari" / "mercari.html"
+default_baseline_path = Path(__file__).parent / "baseline.json"
+
+SECTIONS = ["extract", "clean", "e2e", "retry", "redirect"]
+
+# clean_html_textに渡す商品説明文の大きさ(KB)
+CLEAN_SIZES_KB = [10, 100, 1000]
+
+
+def _percentile(values: list[float], q: float) -> float:
+    """
+    最近傍順位法でq(0〜100)パーセンタイルを返す
+    """
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def _sample(func, repeat: int) -> list[float]:
+    """
+    funcをrepeat回実行し、1回ごとの秒数のリストを返す
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def _latency_metrics(prefix: str, durations: list[float]) -> dict[str, float]:
+    return {
+        f"{prefix}.p50_ms": _percentile(durations, 50) * 1000,
+        f"{prefix}.p95_ms": _percentile(durations, 95) * 1000,
+    }
+
+
+def _peak_rss_mb() -> float | None:
+    """
+    このプロセスのピークメモリ(RSS, MB)を返す
+
+    NOTE: Linuxのru_maxrssはfork/execをまたいで親プロセスの最大値を引き継ぐため、
+    別プロセスで計測しても親の値以上になる。Linuxでは/proc/self/statusのVmHWM
+    (このプロセスのアドレス空間の最大値で、execでリセットされる)を使い、
+    ru_maxrssは/procがないOS(macOSなど)でだけ使う
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # NOTE: ru_maxrssはLinuxではKB、macOSではバイト
+    if sys.platform == "darwin":
+        return peak / 1024 / 1024
+    return peak / 1024
+
+
+def bench_extract(repeat: int) -> dict[str, float]:
+    """
+    YahaucSpiderのパースと各抽出メソッドを計測する
+    """
+    content = yahauc_fixture_path.read_bytes()
+    spider = YahaucSpider([])
+    soup = parse_html(content, spider.parser_backend)
+
+    parse = _sample(lambda: parse_html(content, spider.parser_backend), repeat)
+    next_data = _sample(lambda: spider._extract_fields_from_next_data(content), repeat)
+    dom = _sample(lambda: spider._extract_fields_from_dom(soup), repeat)
+
+    metrics = {
+        **_latency_metrics("yahauc.parse", parse),
+        **_latency_metrics("yahauc.next_data", next_data),
+        **_latency_metrics("yahauc.dom", dom),
+        # NOTE: 1ページあたりの処理時間(中央値)から求めた、抽出だけの処理能力
+        "yahauc.next_data.pages_per_sec": 1 / _percentile(next_data, 50),
+        "yahauc.dom.pages_per_sec": 1
+        / (_percentile(parse, 50) + _percentile(dom, 50)),
+    }
+    for extractor in spider._dom_field_extractors().values():
+        durations = _sample(lambda: extractor(soup), repeat)
+        metrics.update(_latency_metrics(f"yahauc.{extractor.__name__}", durations))
+
+    metrics.update(_bench_mercari_snapshot(repeat))
+    return metrics
+
+
+def _bench_mercari_snapshot(repeat: int) -> dict[str, float]:
+    """
+    メルカリのDOMスナップショットをブラウザで開き、_extract_fieldsを計測する
+
+    NOTE: メルカリの抽出はブラウザ上のスクリプトで行うため、Chromeが必要
+    スナップショットかChromeが無い場合は計測しない
+    """
+    if not mercari_fixture_path.exists():
+        print(
+            f"mercari: {mercari_fixture_path.name} が無いため計測しません"
+            "(--save-mercari-snapshot で作成できます)"
+        )
+        return {}
+
+    from spiders.mercari.mercari_spider import MercariSpider
+
+    spider = MercariSpider([])
+    try:
+        spider.driver = spider._load_selenium("tuned")
+    except Exception as e:
+        print(f"mercari: ブラウザを起動できないため計測しません: {e}")
+        return {}
+    try:
+        spider.driver.get(mercari_fixture_path.resolve().as_uri())
+        page_type = "customer_posting"
+        durations = _sample(lambda: spider._extract_fields(page_type), repeat)
+    finally:
+        spider._quit_driver()
+    return _latency_metrics("mercari.extract_fields", durations)
+
+
+def save_mercari_snapshot(url: str) -> None:
+    """
+    メルカリの商品ページを開き、表示が終わったDOMをスナップショットとして保存する
+
+    NOTE: 保存したファイルを開いたときにページのスクリプトが動かないよう、scriptタグは除く
+    """
+    from selenium.webdriver.support.ui import WebDriverWait
+    from spiders.mercari.mercari_spider import CONTENT_READY_SCRIPT, MercariSpider
+
+    spider = MercariSpider([url])
+    spider.driver = spider._load_selenium("tuned")
+    try:
+        spider.driver.get(url)
+        page_type = spider.determine_page_type(url)
+        WebDriverWait(spider.driver, spider.page_time_budget).until(
+            lambda driver: driver.execute_script(CONTENT_READY_SCRIPT, page_type)
+        )
+        page_source = spider.driver.page_source
+    finally:
+        spider._quit_driver()
+    page_source = re.sub(r"<script\b.*?</script>", "", page_source, flags=re.S)
+    mercari_fixture_path.write_text(page_source, encoding="utf-8")
+    print(f"Saved {mercari_fixture_path} ({len(page_source) / 1024:.0f} KB)")
+
+
+def bench_clean(repeat: int) -> dict[str, float]:
+    """
+    clean_html_textを大きな商品説明文(フィクスチャの説明文を繰り返したもの)で計測する
+    """
+    detail = YahaucSpider._load_next_data_detail(yahauc_fixture_path.read_bytes())
+    description_html = detail["descriptionHtml"]
+
+    metrics = {}
+    for size_kb in CLEAN_SIZES_KB:
+        copies = max(1, size_kb * 1024 // len(description_html.encode()))
+        text = description_html * copies
+        durations = _sample(lambda: YahaucSpider.clean_html_text(text), repeat)
+        metrics.update(_latency_metrics(f"clean_html_text.{size_kb}kb", durations))
+    return metrics
+
+
+def bench_e2e(args) -> dict[str, float]:
+    """
+    ローカルのHTTPサーバーに対してmain()を別プロセスで実行し、処理能力とピークメモリを計測する
+    """
+    with StandInServer(
+        yahauc_fixture_path,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        not_found_rate=args.not_found_rate,
+        too_many_requests_rate=args.too_many_requests_rate,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    ) as server:
+        result = _run_e2e_process(server.base_url, vars(args))
+        status_counts = dict(sorted(server.status_counts.items()))
+
+    print(f"e2e: stand-in server responses {status_counts}")
+
+    latencies = result["latencies"]
+    metrics = {
+        "e2e.pages_per_sec": args.e2e_urls / result["elapsed"],
+        **_latency_metrics("e2e.page", latencies),
+        "e2e.output_rows": result["output_rows"],
+    }
+    if result["peak_rss_mb"] is not None:
+        metrics["e2e.peak_rss_mb"] = result["peak_rss_mb"]
+    return metrics
+
+
+def bench_retry(args) -> dict[str, float]:
+    """
+    429を多めに返すサーバーに対して再試行ありでmain()を実行し、429が再試行で回復するかを確かめる
+
+    NOTE: 再試行の待ちはretry_wait_msに縮める(実際の待ちは4秒以上あるため)
+    """
+    with StandInServer(
+        yahauc_fixture_path,
+        latency=args.latency_ms / 1000,
+        too_many_requests_rate=args.retry_429_rate,
+        seed=args.seed,
+    ) as server:
+        result = _run_e2e_process(
+            server.base_url,
+            {
+                **vars(args),
+                "e2e_urls": args.retry_urls,
+                "max_attempts": args.retry_max_attempts,
+                "retry_wait": args.retry_wait_ms / 1000,
+            },
+        )
+        status_counts = dict(sorted(server.status_counts.items()))
+
+    print(f"retry: stand-in server responses {status_counts}")
+    # NOTE: 429を返したのに再試行していなければ、再試行を迂回する経路がある
+    if status_counts.get(429) and not result["retries"]:
+        raise RuntimeError(
+            f"retry run served {status_counts[429]} 429 responses but retried none"
+        )
+    return {
+        "retry.retries": result["retries"],
+        "retry.failed_rows": result["failed_rows"],
+        "retry.output_rows": result["output_rows"],
+    }
+
+
+def bench_redirect(args) -> dict[str, float]:
+    """
+    終了した商品を404と301で返すサーバーに対してmain()を実行し、どちらもendedになるかを確かめる
+    """
+    with StandInServer(
+        yahauc_fixture_path,
+        latency=args.latency_ms / 1000,
+        not_found_rate=args.redirect_not_found_rate,
+        redirect_rate=args.redirect_rate,
+        seed=args.seed,
+    ) as server:
+        result = _run_e2e_process(
+            server.base_url,
+            {**vars(args), "e2e_urls": args.redirect_urls, "max_attempts": 1},
+        )
+        status_counts = dict(sorted(server.status_counts.items()))
+        expected_ended = sum(
+            1
+            for item_id in _e2e_item_ids(args.redirect_urls)
+            if server.is_not_found(item_id) or server.is_redirected(item_id)
+        )
+
+    print(f"redirect: stand-in server responses {status_counts}")
+    row_statuses = result["row_statuses"]
+    if row_statuses.get("ended", 0) != expected_ended or row_statuses.get("error"):
+        raise RuntimeError(
+            f"expected {expected_ended} ended rows from 404/301 responses, "
+            f"got row statuses {row_statuses}"
+        )
+    return {
+        "redirect.ended_rows": row_statuses.get("ended", 0),
+        "redirect.output_rows": result["output_rows"],
+    }
+
+
+def _e2e_item_ids(count: int) -> list[str]:
+    """
+    e2eの入力に使う商品ID
+    """
+    return [f"b{1000000000 + i}" for i in range(count)]
+
+
+def _run_e2e_process(base_url: str, options: dict) -> dict:
+    """
+    ローカルのサーバーを向くmain()を別プロセスで実行し、結果を返す
+    """
+    # NOTE: ピークメモリを他の計測と混ぜないよう、クロールは別プロセスで行う
+    # (子プロセスのピークは_peak_rss_mbでそのプロセス自身の値を読む)
+    context = multiprocessing.get_context("spawn")
+    result_queue = context.Queue()
+    process = context.Process(
+        target=_run_e2e_child,
+        args=(base_url, options, result_queue),
+    )
+    process.start()
+    result = result_queue.get()
+    process.join()
+    if "error" in result:
+        raise RuntimeError(f"e2e run failed: {result['error']}")
+    return result
+
+
+def _run_e2e_child(base_url: str, options: dict, result_queue) -> None:
+    """
+    (子プロセス)ローカルのサーバーを向くように設定してmain()を実行する
+    """
+    try:
+        result_queue.put(_run_e2e(base_url, options))
+    except Exception as e:
+        result_queue.put({"error": repr(e)})
+
+
+def _run_e2e(base_url: str, options: dict) -> dict:
+    import main as crawler_main
+    from spiders._base_spider import BaseSpider
+    from spiders._rate_limiter import AdaptiveRateLimiter
+    from spiders._session_manager import session_manager
+
+    # NOTE: 404や429のエラーログで計測結果が埋もれないようにする
+    logging.disable(logging.ERROR)
+
+    # NOTE: 実サイト向けの設定(レート・warm-up先・Cookieの保存先)をローカルのサーバー向けにする
+    limiter = AdaptiveRateLimiter(
+        initial_rate=options["rate"], max_rate=options["rate"], burst=options["rate"]
+    )
+    BaseSpider.rate_limiter = limiter
+    session_manager.rate_limiter = limiter
+    session_manager.warmup_url = f"{base_url}/"
+    session_manager.cookie_path = None
+    if options.get("retry_wait") is not None:
+        crawler_main.RetryPolicy = functools.partial(
+            crawler_main.RetryPolicy,
+            wait_min=options["retry_wait"],
+            wait_max=options["retry_wait"],
+        )
+    YahaucSpider.item_url_patterns = [
+        (
+            re.compile(re.escape(base_url) + re.escape(ITEM_PATH_PREFIX) + r"(\w+)"),
+            base_url + ITEM_PATH_PREFIX + "{}",
+        ),
+    ]
+
+    # 1ページごとの所要時間(再試行・レート制限の待ちを含む)を記録する
+    latencies = []
+    scrape = YahaucSpider._scrape
+
+    def timed_scrape(self, url):
+        start = time.perf_counter()
+        try:
+            return scrape(self, url)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    YahaucSpider._scrape = timed_scrape
+
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        mapping_path = workdir / "url_mapping.json"
+        host = base_url.split("://", 1)[1].split(":")[0]
+        mapping_path.write_text(json.dumps([{"domain": host, "site_name": "yahauc"}]))
+        with open(workdir / "入力.csv", "w", encoding="utf-8-sig") as f:
+            f.write("url\n")
+            for item_id in _e2e_item_ids(options["e2e_urls"]):
+                f.write(f"{base_url}{ITEM_PATH_PREFIX}{item_id}\n")
+
+        argv = [
+            "--workdir",
+            str(workdir),
+            "--url-mapping",
+            str(mapping_path),
+            "--max-concurrency",
+            str(options["concurrency"]),
+            "--max-concurrency-per-host",
+            str(options["concurrency"]),
+            "--max-attempts",
+            str(options["max_attempts"]),
+            "--negative-cache-days",
+            "0",
+        ]
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            crawler_main.main(argv)
+        elapsed = time.perf_counter() - start
+
+        output_path = next(workdir.glob("output_*.csv"))
+        with open(output_path, encoding="utf-8-sig", newline="") as f:
+            # NOTE: merged_infoなどは改行を含むため、行数はcsvで数える
+            rows = list(csv.DictReader(f))
+        run_summary = json.loads(next(workdir.glob("runs/*.metrics.json")).read_text())
+
+    return {
+        "elapsed": elapsed,
+        "latencies": latencies,
+        "output_rows": len(rows),
+        "failed_rows": sum(1 for row in rows if row["status"] == "error"),
+        "row_statuses": dict(Counter(row["status"] for row in rows)),
+        "retries": sum(site["retries"] for site in run_summary["sites"].values()),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def compare_with_baseline(
+    metrics: dict[str, float], baseline: dict, tolerance: float
+) -> list[str]:
+    """
+    ベースラインと比べて、tolerance(割合)を超えて悪くなった項目を返す
+
+    pages_per_secは大きいほど良く、それ以外(ms・MB)は小さいほど良い
+    """
+    regressions = []
+    print(f"{'metric':<44} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, value in metrics.items():
+        base = baseline["metrics"].get(name)
+        if not base:
+            print(f"{name:<44} {'-':>10} {value:>10.2f} {'new':>8}")
+            continue
+        change = (value - base) / base
+        higher_is_better = name.endswith("pages_per_sec")
+        regressed = (-change if higher_is_better else change) > tolerance
+        # NOTE: 出力行数は計測値ではなく正しさの確認なので、一致しなければ回帰とする
+        if name.endswith("output_rows"):
+            regressed = value != base
+        # NOTE: 再試行の回数はスレッドの順番で揺れるため比べない(再試行しないことはbench_retryで検出する)
+        elif name.startswith("retry."):
+            regressed = False
+        print(
+            f"{name:<44} {base:>10.2f} {value:>10.2f} {change:>+8.1%}"
+            f"{'  REGRESSION' if regressed else ''}"
+        )
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=code_dir,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sections", nargs="+", choices=SECTIONS, default=SECTIONS)
+    parser.add_argument("--repeat", type=int, default=50, help="extract/cleanの繰り返し回数")
+    parser.add_argument("--e2e-urls", type=int, default=200, help="e2eで取得するURLの数")
+    parser.add_argument("--latency-ms", type=float, default=50, help="サーバーの応答時間(ミリ秒)")
+    parser.add_argument("--jitter-ms", type=float, default=20, help="応答時間の揺らぎ(±ミリ秒)")
+    parser.add_argument("--not-found-rate", type=float, default=0.05, help="404を返す商品の割合")
+    parser.add_argument(
+        "--too-many-requests-rate", type=float, default=0.02, help="429を返すリクエストの割合"
+    )
+    parser.add_argument(
+        "--retry-after", type=float, default=0, help="429に付けるRetry-After(秒。0なら付けない)"
+    )
+    parser.add_argument("--rate", type=float, default=50, help="1秒あたりのリクエスト数の上限")
+    parser.add_argument("--concurrency", type=int, default=8, help="同時リクエスト数")
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=1,
+        help="1つのURLを試す回数(再試行の待ちは4秒以上あるため、デフォルトでは再試行しない)",
+    )
+    parser.add_argument("--retry-urls", type=int, default=50, help="retryで取得するURLの数")
+    parser.add_argument(
+        "--retry-429-rate", type=float, default=0.3, help="retryで429を返すリクエストの割合"
+    )
+    parser.add_argument(
+        "--retry-max-attempts", type=int, default=4, help="retryで1つのURLを試す回数"
+    )
+    parser.add_argument(
+        "--retry-wait-ms", type=float, default=20, help="retryでの再試行までの待ち(ミリ秒)"
+    )
+    parser.add_argument(
+        "--redirect-urls", type=int, default=50, help="redirectで取得するURLの数"
+    )
+    parser.add_argument(
+        "--redirect-rate", type=float, default=0.2, help="redirectで301を返す商品の割合"
+    )
+    parser.add_argument(
+        "--redirect-not-found-rate",
+        type=float,
+        default=0.1,
+        help="redirectで404を返す商品の割合",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", type=Path, default=default_baseline_path)
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="今回の結果をベースラインとして保存する"
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="回帰とみなす悪化の割合"
+    )
+    parser.add_argument(
+        "--save-mercari-snapshot",
+        metavar="URL",
+        help="メルカリの商品ページのDOMを spiders/mercari/mercari.html に保存して終了する",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+    if args.save_mercari_snapshot:
+        save_mercari_snapshot(args.save_mercari_snapshot)
+        return 0
+
+    # NOTE: 抽出時のWARNINGログで計測結果が埋もれないようにする
+    logging.disable(logging.WARNING)
+
+    metrics = {}
+    if "extract" in args.sections:
+        metrics.update(bench_extract(args.repeat))
+    if "clean" in args.sections:
+        metrics.update(bench_clean(args.repeat))
+    if {"extract", "clean"} & set(args.sections):
+        peak_rss_mb = _peak_rss_mb()
+        if peak_rss_mb is not None:
+            metrics["micro.peak_rss_mb"] = peak_rss_mb
+    if "e2e" in args.sections:
+        metrics.update(bench_e2e(args))
+    if "retry" in args.sections:
+        metrics.update(bench_retry(args))
+    if "redirect" in args.sections:
+        metrics.update(bench_redirect(args))
+
+    parameters = {
+        name: value
+        for name, value in vars(args).items()
+        if name not in ("baseline", "save_baseline", "tolerance", "save_mercari_snapshot")
+    }
+    regressions = []
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+        print(
+            f"baseline: {args.baseline.name} "
+            f"(revision {baseline.get('revision')}, {baseline.get('created_at')})"
+        )
+        if baseline.get("parameters") != parameters:
+            print("NOTE: ベースラインと計測条件が異なります")
+        regressions = compare_with_baseline(metrics, baseline, args.tolerance)
+    else:
+        for name, value in metrics.items():
+            print(f"{name:<44} {value:>10.2f}")
+
+    if args.save_baseline:
+        args.baseline.write_text(
+            json.dumps(
+                {
+                    "revision": _git_revision(),
+                    "created_at": datetime.now().isoformat(timespec="seconds"),
+                    "python": platform.python_version(),
+                    "parameters": parameters,
+                    "metrics": metrics,
+                },
+                indent=2,
+                ensure_ascii=False,
+            )
+        )
+        print(f"Saved baseline to {args.baseline}")
+
+    if regressions:
+        print(f"{len(regressions)} metrics regressed by more than {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
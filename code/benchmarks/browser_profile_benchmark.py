@@ -0,0 +1,74 @@
+"""
+メルカリのページ取得をブラウザプロファイルごとに比較するベンチマーク
+
+default(素のChrome)とtuned(ヘッドレス・eager・リソースブロック)で同じURLを取得し、
+1ページあたりの所要時間と転送バイト数、tunedで削減できた量を表示する。
+実際にメルカリへアクセスするため、URLは数件にとどめること。
+
+使い方:
+    python benchmarks/browser_profile_benchmark.py https://jp.mercari.com/item/m12345678901 ...
+"""
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+# 現在のファイルの親ディレクトリ(code/)をモジュール検索パスに入れる
+code_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(code_dir))
+
+from spiders.mercari.mercari_spider import MercariSpider
+
+PROFILES = ("default", "tuned")
+
+
+def _measure(profile: str, urls: list[str]) -> dict:
+    """
+    指定プロファイルでURLを順に取得し、1ページあたりの平均値を返す
+    """
+    spider = MercariSpider(urls, browser_profile=profile)
+    spider.driver = spider._load_selenium()
+    elapsed = 0.0
+    try:
+        for url in urls:
+            start = time.perf_counter()
+            try:
+                spider._scrape(url)
+            except Exception as e:
+                print(f"[{profile}] failed: {url} - {e}")
+            elapsed += time.perf_counter() - start
+    finally:
+        spider._quit_driver()
+
+    pages = spider._page_metrics["pages"] or 1
+    return {
+        "seconds": elapsed / len(urls),
+        "kilobytes": spider._page_metrics["transfer_bytes"] / pages / 1024,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("urls", nargs="+", help="計測するメルカリの商品URL")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.WARNING)
+
+    results = {profile: _measure(profile, args.urls) for profile in PROFILES}
+
+    print(f"{'profile':<10} {'s/page':>8} {'KB/page':>9}")
+    for profile, result in results.items():
+        print(f"{profile:<10} {result['seconds']:>8.2f} {result['kilobytes']:>9.0f}")
+
+    default, tuned = results["default"], results["tuned"]
+    print(
+        f"saved by tuned: {default['seconds'] - tuned['seconds']:.2f} s/page, "
+        f"{default['kilobytes'] - tuned['kilobytes']:.0f} KB/page"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+HTMLパーサーごとのパース時間・抽出時間を計測するベンチマーク
+
+同梱のyahauc.htmlを使い、各パーサーでYahaucSpiderのセレクタが
+html.parserと同じ結果を返すことも確認する。
+あわせて、__NEXT_DATA__の一部の項目がnullのケースでも抽出が失敗しないことを確認する。
+
+使い方:
+    python benchmarks/parse_benchmark.py [--repeat 20]
+"""
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+# 現在のファイルの親ディレクトリ(code/)をモジュール検索パスに入れる
+code_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(code_dir))
+
+from spiders.yahauc.yahauc_spider import YahaucSpider
+from spiders._html_parser import (
+    FALLBACK_PARSER_BACKEND,
+    available_parser_backends,
+    parse_html,
+)
+
+fixture_path = code_dir / "spiders" / "yahauc" / "yahauc.html"
+
+# 出力が一致することを確認するセレクタ
+CHECKED_SELECTORS = [
+    "#itemTitle",
+    "section>dl",
+    "div#itemInfo dt",
+    ".ProductImage__image img",
+]
+
+
+# __NEXT_DATA__の商品詳細情報を書き換えたケースと、そのときに期待するshipping_region
+# NOTE: 出品者の所在地が非公開などでnullになる商品がある
+NULL_DETAIL_CASES = {
+    "seller.location=null": (
+        lambda detail: {**detail, "seller": {**detail["seller"], "location": None}},
+        None,
+    ),
+    "seller=null": (lambda detail: {**detail, "seller": None}, None),
+    "seller.location.prefecture=null": (
+        lambda detail: {
+            **detail,
+            "seller": {**detail["seller"], "location": {"prefecture": None}},
+        },
+        None,
+    ),
+}
+
+
+def _check_null_detail_cases(spider, content: bytes) -> list[str]:
+    """
+    NULL_DETAIL_CASESで_fields_from_detailが例外を出さず、期待した値を返すかを確認する
+
+    Returns:
+        list[str]: 失敗したケース
+    """
+    detail = spider._load_next_data_detail(content)
+    failures = []
+    for name, (modify, expected_region) in NULL_DETAIL_CASES.items():
+        try:
+            fields = spider._fields_from_detail(modify(detail))
+        except Exception as e:
+            failures.append(f"{name}: {type(e).__name__}: {e}")
+            continue
+        if fields.get("shipping_region") != expected_region:
+            failures.append(
+                f"{name}: shipping_region={fields.get('shipping_region')!r}"
+            )
+    return failures
+
+
+def _selector_snapshot(soup) -> dict:
+    """
+    各セレクタで取れる要素のテキストと属性を返す
+    """
+    return {
+        selector: [
+            (element.get_text(), sorted(element.attrs.items(), key=str))
+            for element in soup.select(selector)
+        ]
+        for selector in CHECKED_SELECTORS
+    }
+
+
+def _normalize_fields(fields: dict) -> dict:
+    # NOTE: 画像URLはsetで重複排除しているため順序を無視して比較する
+    return {
+        **fields,
+        "image_urls": sorted(fields["image_urls"].split("|")),
+    }
+
+
+def _timeit(func, repeat: int) -> float:
+    """
+    funcをrepeat回実行し、1回あたりの平均秒数を返す
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    # NOTE: 抽出時のWARNINGログで計測結果が埋もれないようにする
+    logging.disable(logging.WARNING)
+
+    content = fixture_path.read_bytes()
+    spider = YahaucSpider([])
+
+    reference_soup = parse_html(content, FALLBACK_PARSER_BACKEND)
+    reference_selectors = _selector_snapshot(reference_soup)
+    reference_fields = _normalize_fields(
+        spider._extract_fields_from_dom(reference_soup)
+    )
+
+    mismatches = []
+    print(f"fixture: {fixture_path.name} ({len(content) / 1024:.0f} KB), repeat={args.repeat}")
+    print(f"{'backend':<12} {'parse ms':>10} {'extract ms':>11} {'total ms':>10}  identical")
+    for backend in available_parser_backends():
+        soup = parse_html(content, backend)
+        identical = (
+            _selector_snapshot(soup) == reference_selectors
+            and _normalize_fields(spider._extract_fields_from_dom(soup))
+            == reference_fields
+        )
+        if not identical:
+            mismatches.append(backend)
+
+        parse_time = _timeit(lambda: parse_html(content, backend), args.repeat)
+        extract_time = _timeit(
+            lambda: spider._extract_fields_from_dom(soup), args.repeat
+        )
+        print(
+            f"{backend:<12} {parse_time * 1000:>10.2f} {extract_time * 1000:>11.2f} "
+            f"{(parse_time + extract_time) * 1000:>10.2f}  {'yes' if identical else 'NO'}"
+        )
+
+    # NOTE: 参考として__NEXT_DATA__からの抽出(パースなし)の時間も出す
+    next_data_time = _timeit(
+        lambda: spider._extract_fields_from_next_data(content), args.repeat
+    )
+    print(f"{'next_data':<12} {'-':>10} {next_data_time * 1000:>11.2f} {next_data_time * 1000:>10.2f}  -")
+
+    null_case_failures = _check_null_detail_cases(spider, content)
+    for failure in null_case_failures:
+        print(f"__NEXT_DATA__ case failed: {failure}")
+
+    if mismatches:
+        print(f"Output differs from {FALLBACK_PARSER_BACKEND}: {', '.join(mismatches)}")
+    if mismatches or null_case_failures:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
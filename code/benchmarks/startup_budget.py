@@ -0,0 +1,87 @@
+"""
+main.pyの起動時間(import時間)が予算内に収まっているかを確認するスクリプト
+
+`python -X importtime` でmain.pyをimportし、
+- main.pyのimportにかかった時間(累計)が予算以内であること
+- 重い依存ライブラリ(openpyxl・selenium・requestsなど)が起動時にimportされていないこと
+を確認する。どちらかを満たさない場合は終了コード1を返す。
+
+使い方:
+    python benchmarks/startup_budget.py [--budget-ms 100] [--repeat 5]
+"""
+
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+# 現在のファイルの親ディレクトリ(code/)
+code_dir = Path(__file__).parent.parent
+
+# 起動時にimportしてはいけない(使うときに初めてimportする)ライブラリ
+LAZY_MODULES = ("openpyxl", "pyarrow", "selenium", "requests", "bs4", "lxml")
+
+
+def _import_times() -> dict[str, int]:
+    """
+    main.pyをimportし、main.pyが読み込んだモジュールごとのimport時間(累計, マイクロ秒)を返す
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=code_dir,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # NOTE: 出力は "import time: self [us] | cumulative | imported package" の形式
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        if name.strip() == "site":
+            # NOTE: ここまではインタプリタ自体の起動(site)でimportされたモジュールなので除く
+            times.clear()
+            continue
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--budget-ms", type=float, default=100.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    # NOTE: 1回目はバイトコードの生成などで遅くなるため、最速の回を使う
+    runs = [_import_times() for _ in range(args.repeat)]
+    times = min(runs, key=lambda run: run["main"])
+    main_ms = times["main"] / 1000
+
+    print(f"main.py import: {main_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    print("slowest modules:")
+    imported = {name: us for name, us in times.items() if name != "main"}
+    for name, us in sorted(imported.items(), key=lambda item: -item[1])[: args.top]:
+        print(f"  {us / 1000:>8.1f} ms  {name}")
+
+    eager_modules = sorted(
+        {name.split(".")[0] for name in times} & set(LAZY_MODULES)
+    )
+
+    failed = False
+    if main_ms > args.budget_ms:
+        print(f"NG: main.py import exceeds the budget by {main_ms - args.budget_ms:.1f} ms")
+        failed = True
+    if eager_modules:
+        print(f"NG: imported at startup: {', '.join(eager_modules)}")
+        failed = True
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
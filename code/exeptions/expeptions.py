@@ -38,3 +38,18 @@ class Http429TooManyRequestsException(Exception):
         self.url = url
         self.message = message
         super().__init__(self.message)
+
+
+class Http5xxServerError(Exception):
+    def __init__(self, url, status_code, message=None):
+        self.url = url
+        self.status_code = status_code
+        self.message = message or f"HTTP Error {status_code}: Server Error"
+        super().__init__(self.message)
+
+
+class HttpArchiveMissError(Exception):
+    def __init__(self, url, message="URL not found in HTTP archive"):
+        self.url = url
+        self.message = message
+        super().__init__(self.message)
@@ -1,7 +1,11 @@
-import pandas as pd
 import os
 import sys
 import json
+import time
+import argparse
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 
 # 現在のファイルのディレクトリを取得して、そこを基準にする
@@ -9,134 +13,609 @@ current_dir = Path(__file__).parent
 # sys.pathに追加して、このディレクトリをモジュール検索パスに入れる
 sys.path.insert(0, str(current_dir))
 
-from spiders.yahauc.yahauc_spider import YahaucSpider
-from spiders.mercari.mercari_spider import MercariSpider
+from spiders._registry import SpiderRegistry
+from spiders._retry import RetryPolicy
+from spiders._run_metrics import RunMetrics
+from spiders._http_cache import HttpCache
+from pipelines.input_reader import iter_input_rows
+from pipelines.item_store import ItemStore
+from pipelines.output_writer import DEFAULT_COLUMNAR_COMPRESSION, StreamingOutputWriter
+from spiders._item_status import ERROR_COLUMN, UNSUPPORTED_SITE_ERROR
 
 
-def main():
-    scraped_data = []
+def main(argv=None):
+    args = _parse_args(argv)
+    # NOTE: 入力ファイル・出力・ジャーナル・ストアはworkdirに置く(デフォルトはこのディレクトリ)
+    workdir = args.workdir
+    http_cache = None
+    if args.http_cache:
+        http_cache = HttpCache(
+            workdir / ".cache" / "http_cache.sqlite3",
+            ttl=args.http_cache_ttl,
+            max_bytes=args.http_cache_max_mb * 1024 * 1024,
+        )
+    http_archive = _open_http_archive(args)
+    # NOTE: URLごとのフェーズ別の時間やドメインごとの応答時間は実行ごとに集計する
+    run_metrics = RunMetrics()
+    profiler = None
+    if args.profile:
+        # NOTE: プロファイルしないときはimportしない
+        from spiders._profiler import RunProfiler
+
+        profiler = RunProfiler(
+            run_metrics, top=args.profile_top, frames=args.profile_frames
+        )
+    # 全スパイダー共通の設定
+    spider_options = {
+        "parser_backend": args.parser,
+        "http_archive": http_archive,
+        "metrics": run_metrics,
+        # NOTE: 再試行の回数は実行全体で共有する
+        "retry_policy": RetryPolicy(
+            max_attempts=args.max_attempts, run_budget=args.retry_budget
+        ),
+    }
+    # Yahooオークションのスパイダーに渡すクロール設定
+    yahauc_options = {
+        **spider_options,
+        "crawl_mode": "sequential" if args.sequential else "async",
+        "max_concurrency": args.max_concurrency,
+        "max_concurrency_per_host": args.max_concurrency_per_host,
+        "http_cache": http_cache,
+        "extract_mode": args.extract_mode,
+    }
+    # メルカリのスパイダーに渡すブラウザ設定
+    mercari_options = {
+        **spider_options,
+        "workers": args.mercari_workers,
+        "pages_per_driver": args.pages_per_driver,
+        "browser_profile": args.browser_profile,
+        "page_time_budget": args.page_time_budget,
+    }
+
+    # 現在の日時を取得してファイル名を生成
+    current_time = datetime.now().strftime("%Y%m%d%H%M")
+    # NOTE: 結果は1件ずつ実行ジャーナル(JSONL)に書き出し、落ちても途中までは残す
+    writer = _open_journal(workdir / "runs", args.resume, current_time)
+    journal_path = writer.journal_path
+    # NOTE: 同じ分に始まった別の実行の出力を上書きしないよう、出力はジャーナルと同じ名前にする
+    # (再開したときは、再開したジャーナルの出力を作り直す)
+    run_id = journal_path.stem.removeprefix("run_")
+    output_filename = workdir / f"output_{run_id}.csv"
+
+    # NOTE: ホスト名からサイト名を引き、サイト名からスパイダーを見つける
+    registry = _load_registry(args.url_mapping)
     # インデックス情報を含むURL辞書を取得
-    url_data = _load_url_data()
-    # 元のURLとインデックスのマッピングを作成
-    url_to_index_map = {}
+    url_data = _load_url_data(registry, workdir)
+    if args.resume is not None:
+        # NOTE: 再開時は同じジャーナルに追記し、取得済みの行は取り直さない
+        completed_keys = writer.completed_keys()
+        url_data = {
+            site_name: [
+                url_item
+                for url_item in url_items
+                if (url_item["index"], url_item["url"]) not in completed_keys
+            ]
+            for site_name, url_items in url_data.items()
+        }
+        remaining = sum(len(url_items) for url_items in url_data.values())
+        print(f"{journal_path.name} から再開します(残り {remaining} 件)")
+    # 正規化したURLと、そのURLを参照している入力行(インデックスとURL)のマッピング
+    url_to_index_map: dict[str, list[dict]] = {}
+
+    # NOTE: 取得した結果はサイトと商品IDごとにストアに保存し、次回以降の差分取得と価格比較に使う
+    item_store = ItemStore(workdir / ".cache" / "items.sqlite3")
+    run_started_at = time.time()
 
-    # 各URLのインデックスを記録
-    for site_name, url_items in url_data.items():
+    def write_item(spider_class, item: dict, from_store: bool = False) -> None:
+        if not from_store:
+            item_store.upsert(
+                spider_class.name, spider_class.item_id(item["original_url"]), item
+            )
+        # NOTE: 同じ商品を参照している全ての行に、それぞれのインデックスと元のURLで書き出す
+        url_items = url_to_index_map.get(item["original_url"])
+        if not url_items:
+            writer.write({**item, "original_index": None})
+            return
         for url_item in url_items:
-            url_to_index_map[url_item["url"]] = url_item["index"]
-
-    for site_name, url_items in url_data.items():
-        # URLsのリストを取得
-        urls = [item["url"] for item in url_items]
-
-        if site_name == "yahauc":
-            spider = YahaucSpider(urls)
-            site_data = spider.run()
-            # 元のインデックスを各スクレイピング結果に追加
-            for item in site_data:
-                item["original_index"] = url_to_index_map.get(item["original_url"])
-            scraped_data.extend(site_data)
-        elif site_name == "mercari":
-            spider = MercariSpider(urls)
-            site_data = spider.run()
-            # 元のインデックスを各スクレイピング結果に追加
-            for item in site_data:
-                item["original_index"] = url_to_index_map.get(item["original_url"])
-            scraped_data.extend(site_data)
-        else:
-            # 未対応のサイトの場合は、URLだけを含む最小限のデータを追加
-            for url_item in url_items:
-                scraped_data.append(
-                    {
-                        "original_url": url_item["url"],
-                        "original_index": url_item["index"],
-                        # 他のフィールドは空のままにして、URLとインデックスだけを保持
-                    }
+            writer.write(
+                {
+                    **item,
+                    "original_url": url_item["url"],
+                    "original_index": url_item["index"],
+                }
+            )
+
+    # サイトごとのスパイダーの設定(ないサイトは共通の設定を使う)
+    site_options = {
+        "yahauc": yahauc_options,
+        "mercari": mercari_options,
+    }
+
+    with writer:
+        # サイトごとのスパイダーを用意する
+        spiders = []
+        for site_name, url_items in url_data.items():
+            spider_class = registry.spider_class(site_name)
+            if spider_class is None:
+                # 未対応のサイトの場合は、URLだけを含む最小限のデータを追加
+                print(
+                    f"{site_name}: 対応するスパイダーがないため {len(url_items)} 件を空欄で出力します"
                 )
+                for url_item in url_items:
+                    writer.write(
+                        {
+                            "original_url": url_item["url"],
+                            "original_index": url_item["index"],
+                            # 他のフィールドは空のままにして、URLとインデックスだけを保持
+                            ERROR_COLUMN: UNSUPPORTED_SITE_ERROR,
+                        }
+                    )
+                continue
 
-    # DataFrameを作成し、元のインデックス順にソート
-    df = pd.DataFrame(scraped_data)
-    if "original_index" in df.columns:
-        df = df.sort_values("original_index")
+            options = site_options.get(site_name, spider_options)
+            # 同じ商品のURLは1回だけ取得する
+            urls = _dedupe_urls(spider_class, url_items, url_to_index_map)
+            if not urls:
+                continue
+            if len(urls) < len(url_items):
+                print(
+                    f"{site_name}: 重複した {len(url_items) - len(urls)} 件のURLをまとめて取得します"
+                )
+            if args.negative_cache_days > 0:
+                # NOTE: 終了・削除済み・売り切れと記録済みの商品にはアクセスしない
+                settled_items, urls = _split_stored_urls(
+                    item_store.lookup_settled,
+                    spider_class,
+                    urls,
+                    args.negative_cache_days * 24 * 60 * 60,
+                )
+                for item in settled_items:
+                    write_item(spider_class, item, from_store=True)
+                if settled_items:
+                    print(
+                        f"{site_name}: 終了・売り切れ済みの {len(settled_items)} 件はアクセスせずに出力します"
+                    )
+            if args.incremental:
+                # NOTE: 鮮度の期限内に取得済みの商品はストアの結果を使い、取り直さない
+                max_age = args.freshness.get(site_name, spider_class.freshness_window)
+                fresh_items, urls = _split_stored_urls(
+                    item_store.lookup_fresh, spider_class, urls, max_age
+                )
+                for item in fresh_items:
+                    write_item(spider_class, item, from_store=True)
+                print(f"{site_name}: {len(fresh_items)} 件を前回の結果から出力します")
+            if not urls:
+                continue
+            spiders.append(
+                spider_class(urls, on_item=partial(write_item, spider_class), **options)
+            )
 
-    # 現在の日時を取得してファイル名を生成
-    from datetime import datetime
+        if profiler is not None:
+            profiler.start()
+        try:
+            _run_spiders(spiders, sequential=args.sequential_sites)
+        finally:
+            if profiler is not None:
+                profiler.stop()
 
-    current_time = datetime.now().strftime("%Y%m%d%H%M")
-    output_filename = current_dir / f"output_{current_time}.csv"
-    # original_indexをインデックスに設定して出力
-    df.set_index("original_index", inplace=True)
-    df.to_csv(output_filename, encoding="utf-8-sig")
+    # 実行のメトリクスをJSONのサマリーとPrometheusのtextfileで書き出す
+    metrics_summary = run_metrics.write_json(journal_path.with_suffix(".metrics.json"))
+    run_metrics.write_prometheus(
+        args.metrics_textfile or journal_path.with_suffix(".prom"), metrics_summary
+    )
+    if profiler is not None:
+        # 遅かったURL・時間のかかった関数・割り当ての多い箇所のレポートを書き出す
+        profile_path = journal_path.with_suffix(".profile.txt")
+        profiler.write_report(profile_path, metrics_summary)
+        print(f"プロファイルを {profile_path} に出力しました")
 
+    # 元のインデックス順に並べたCSVをジャーナルから作成する
+    writer.export_csv(output_filename)
+    # 指定があればParquet/Featherも作成する
+    for file_format in dict.fromkeys(args.export or []):
+        try:
+            writer.export_columnar(
+                output_filename.with_suffix(f".{file_format}"),
+                file_format,
+                compression=args.export_compression,
+            )
+        except ImportError:
+            print(
+                f"{file_format} で出力するには pyarrow が必要です"
+                "(pip install -r requirements/columnar.txt)"
+            )
 
-def _load_input_data():
-    try:
-        # Excelファイルが存在する場合はExcelから読み込む
-        excel_path = current_dir / "入力.xlsx"
-        if excel_path.exists():
-            df = pd.read_excel(excel_path)
-            # インデックスとURLのペアのリストを作成
-            return [
-                {"index": idx, "url": url}
-                for idx, url in enumerate(df.iloc[:, 0].tolist())
-            ]
-        # CSVファイルが存在する場合はCSVから読み込む
-        csv_path = current_dir / "入力.csv"
-        if csv_path.exists():
-            df = pd.read_csv(csv_path)
-            # インデックスとURLのペアのリストを作成
-            return [
-                {"index": idx, "url": url}
-                for idx, url in enumerate(df.iloc[:, 0].tolist())
-            ]
+    # 今回の実行で価格が変わった商品のレポートを作成する
+    item_store.export_price_changes(
+        workdir / f"price_changes_{run_id}.csv", since=run_started_at
+    )
+    item_store.log_stats()
+    item_store.close()
+
+    if http_cache is not None:
+        http_cache.close()
+    if http_archive is not None:
+        http_archive.close()
+
+
+def _dedupe_urls(spider_class, url_items: list[dict], url_to_index_map: dict) -> list[str]:
+    """
+    URLをスパイダーの規則で正規化し、重複を除いた取得対象のURLを返す
+
+    正規化したURLを参照している入力行はurl_to_index_mapに記録する
+    """
+    urls = []
+    for url_item in url_items:
+        canonical_url = spider_class.canonicalize_url(url_item["url"])
+        if canonical_url not in url_to_index_map:
+            url_to_index_map[canonical_url] = []
+            urls.append(canonical_url)
+        url_to_index_map[canonical_url].append(url_item)
+    return urls
+
+
+def _split_stored_urls(
+    lookup, spider_class, urls: list[str], max_age: float
+) -> tuple[list[dict], list[str]]:
+    """
+    URLを、ストアにmax_age秒以内の結果がある商品と、取得する必要がある商品に分ける
+
+    lookupはItemStore.lookup_fresh/lookup_settledのいずれか
+
+    Returns:
+        tuple: (ストアにあった結果のリスト, 取得するURLのリスト)
+    """
+    stored_items = []
+    remaining_urls = []
+    for url in urls:
+        stored = lookup(spider_class.name, spider_class.item_id(url), max_age)
+        if stored is None:
+            remaining_urls.append(url)
         else:
-            print("入力ファイルが見つかりません")
-            return []
+            stored_items.append({**stored, "original_url": url})
+    return stored_items, remaining_urls
+
+
+def _run_spiders(spiders: list, sequential: bool = False) -> None:
+    """
+    サイトごとのスパイダーを実行する
+
+    NOTE: ヤフオク(HTTP)とメルカリ(ブラウザ)は使うリソースもホストも別なので、
+    スパイダーごとにスレッドを分けて同時に走らせる。
+    レート制限はドメインごとなので、サイト間で待ち合うことはない。
+    結果はon_itemでジャーナルに書かれ、並び順は出力時にoriginal_indexで揃える
+    """
+    if sequential or len(spiders) <= 1:
+        for spider in spiders:
+            _run_spider(spider)
+        return
+
+    with ThreadPoolExecutor(
+        max_workers=len(spiders), thread_name_prefix="site"
+    ) as executor:
+        for future in [executor.submit(_run_spider, spider) for spider in spiders]:
+            future.result()
+
+
+def _run_spider(spider) -> None:
+    """
+    スパイダーを1つ実行する(失敗しても他のサイトは止めない)
+    """
+    try:
+        items = spider.run()
     except Exception as e:
-        print(f"エラーが発生しました: {e}")
-        return []
+        print(f"{spider.name} のスクレイピング中にエラーが発生しました: {e}")
+        return
+    # NOTE: 結果はon_item(_emit)でしかジャーナルに書かれない。runが結果を返した場合は
+    # _emitを通っていないため、黙って捨てずに知らせてから書き出す
+    if items:
+        print(
+            f"{spider.name}: run() が _emit を通していない結果を {len(items)} 件返しました。"
+            "crawl_urls で各結果を self._emit に渡してください(今回はここで書き出します)"
+        )
+        for item in items:
+            spider._emit(item)
+
+
+def _parse_args(argv=None):
+    """
+    コマンドライン引数を解析する
+    """
+    parser = argparse.ArgumentParser(description="メルカリとヤフオクのスクレイピングツール")
+    parser.add_argument(
+        "--sequential",
+        action="store_true",
+        help="並行クロールを使わず、1件ずつ順番にスクレイピングする",
+    )
+    parser.add_argument(
+        "--sequential-sites",
+        action="store_true",
+        help="サイトごとのスパイダーを同時に走らせず、1サイトずつ順番に実行する",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=None,
+        help="全体の同時リクエスト数の上限",
+    )
+    parser.add_argument(
+        "--max-concurrency-per-host",
+        type=int,
+        default=None,
+        help="1ホストあたりの同時リクエスト数の上限",
+    )
+    parser.add_argument(
+        "--mercari-workers",
+        type=int,
+        default=None,
+        help="メルカリを並行に取得するブラウザの数",
+    )
+    parser.add_argument(
+        "--pages-per-driver",
+        type=int,
+        default=None,
+        help="ブラウザを起動し直すまでに処理するページ数",
+    )
+    parser.add_argument(
+        "--page-time-budget",
+        type=float,
+        default=None,
+        help="メルカリの1ページにかける時間の上限(秒)",
+    )
+    parser.add_argument(
+        "--browser-profile",
+        choices=["default", "tuned"],
+        default=None,
+        help="ブラウザのプロファイル(tuned: ヘッドレス・eager・画像/フォント/計測タグをブロック)",
+    )
+    parser.add_argument(
+        "--parser",
+        choices=["lxml", "html.parser", "html5lib"],
+        default=None,
+        help="HTMLパーサー(未指定ならスパイダーごとの設定。デフォルトはlxml)",
+    )
+    parser.add_argument(
+        "--extract-mode",
+        choices=["next_data", "dom"],
+        default=None,
+        help="ヤフオクの抽出モード(next_data: __NEXT_DATA__から抽出, dom: HTML全体をパースして抽出)",
+    )
+    parser.add_argument(
+        "--http-cache",
+        action="store_true",
+        help="レスポンスをディスクにキャッシュし、ETag/Last-Modifiedで再検証する",
+    )
+    parser.add_argument(
+        "--http-cache-ttl",
+        type=float,
+        default=6 * 60 * 60,
+        help="キャッシュを再検証なしで使う秒数",
+    )
+    parser.add_argument(
+        "--http-cache-max-mb",
+        type=int,
+        default=500,
+        help="キャッシュの最大サイズ(MB)",
+    )
+    archive_group = parser.add_mutually_exclusive_group()
+    archive_group.add_argument(
+        "--record-http",
+        type=Path,
+        metavar="ARCHIVE",
+        help="HTTPのリクエストとレスポンスをアーカイブ(SQLite)に記録する",
+    )
+    archive_group.add_argument(
+        "--replay-http",
+        type=Path,
+        metavar="ARCHIVE",
+        help="ネットワークにアクセスせず、記録したアーカイブからレスポンスを返す",
+    )
+    parser.add_argument(
+        "--replay-speedup",
+        type=float,
+        default=1.0,
+        help="再生時に記録した応答時間を何倍速にするか(例: 10で1/10の待ち時間)",
+    )
+    parser.add_argument(
+        "--replay-latency",
+        type=float,
+        default=None,
+        help="再生時の応答時間を記録によらずこの秒数にする",
+    )
+    parser.add_argument(
+        "--replay-missing",
+        choices=["error", "cycle"],
+        default="error",
+        help="アーカイブに無いURLの扱い(cycle: 同じホストの記録済みのレスポンスを使い回す)",
+    )
+    parser.add_argument(
+        "--export",
+        choices=["parquet", "feather"],
+        action="append",
+        help="CSVに加えてParquet/Featherでも出力する(複数指定可。要pyarrow)",
+    )
+    parser.add_argument(
+        "--export-compression",
+        choices=["zstd", "lz4", "snappy", "uncompressed"],
+        default=DEFAULT_COLUMNAR_COMPRESSION,
+        help="Parquet/Featherの圧縮形式(snappyはParquetのみ)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="前回までの結果(.cache/items.sqlite3)が鮮度の期限内なら取り直さずに使う",
+    )
+    parser.add_argument(
+        "--freshness",
+        type=_parse_freshness,
+        action="append",
+        metavar="SITE=HOURS",
+        help="サイトごとの鮮度の期限(時間)。例: --freshness yahauc=3 (デフォルト: ヤフオク6時間, その他24時間)",
+    )
+    parser.add_argument(
+        "--negative-cache-days",
+        type=float,
+        default=7,
+        help="終了・削除済み・売り切れと記録した商品にアクセスしない日数(0で無効)",
+    )
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=3,
+        help="タイムアウト・429・5xxのときに1つのURLを試す回数の上限",
+    )
+    parser.add_argument(
+        "--retry-budget",
+        type=int,
+        default=200,
+        help="実行全体で再試行する回数の上限",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="クロール中のスタックのサンプリングとtracemallocで、遅いURL・関数・メモリの割り当てを調べる(実行は遅くなる)",
+    )
+    parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=20,
+        help="プロファイルのレポートに出す件数",
+    )
+    parser.add_argument(
+        "--profile-frames",
+        type=int,
+        default=1,
+        help="tracemallocで記録するトレースバックの深さ(深いほどライブラリ内の割り当てもスパイダーに紐づくが、遅くなる)",
+    )
+    parser.add_argument(
+        "--metrics-textfile",
+        type=Path,
+        default=None,
+        help="Prometheusのtextfileの出力先(デフォルト: runs/run_*.prom)",
+    )
+    parser.add_argument(
+        "--workdir",
+        type=Path,
+        default=current_dir,
+        help="入力ファイル・出力・runs/・.cache/を置くディレクトリ(デフォルト: main.pyのあるディレクトリ)",
+    )
+    parser.add_argument(
+        "--url-mapping",
+        type=Path,
+        default=current_dir / "url_mapping.json",
+        help="ホスト名とサイト名の対応表(デフォルト: url_mapping.json)",
+    )
+    parser.add_argument(
+        "--resume",
+        nargs="?",
+        const="latest",
+        default=None,
+        metavar="JOURNAL",
+        help="中断した実行のジャーナル(runs/run_*.jsonl)から再開する。省略時は最新のジャーナル",
+    )
+    args = parser.parse_args(argv)
+    # NOTE: 実行の最後に失敗しないよう、Featherで使えない圧縮形式はここで弾く
+    if "feather" in (args.export or []) and args.export_compression == "snappy":
+        parser.error("--export feather では --export-compression snappy は使えません")
+    args.freshness = dict(args.freshness or [])
+    return args
 
 
-def _load_url_mapping():
+def _parse_freshness(value: str) -> tuple[str, float]:
+    """
+    "サイト名=時間" を(サイト名, 秒数)に変換する
+    """
+    site_name, _, hours = value.partition("=")
+    try:
+        return site_name, float(hours) * 60 * 60
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"SITE=HOURS の形式で指定してください: {value}")
+
+
+def _open_http_archive(args):
+    """
+    --record-http/--replay-httpが指定されていればHTTPアーカイブを開く
+    """
+    if args.record_http is None and args.replay_http is None:
+        return None
+    # NOTE: 記録・再生しないときはimportしない(requestsの読み込みで起動が遅くなるため)
+    from spiders._http_archive import RECORD_MODE, REPLAY_MODE, HttpArchive
+
+    if args.record_http is not None:
+        return HttpArchive(args.record_http, mode=RECORD_MODE)
+    if not args.replay_http.exists():
+        print(f"アーカイブが見つかりません: {args.replay_http}")
+        sys.exit(1)
+    return HttpArchive(
+        args.replay_http,
+        mode=REPLAY_MODE,
+        speedup=args.replay_speedup,
+        latency=args.replay_latency,
+        missing=args.replay_missing,
+    )
+
+
+def _open_journal(
+    runs_dir: Path, resume: str | None, current_time: str
+) -> StreamingOutputWriter:
+    """
+    結果を書き出す実行ジャーナルを開く
+
+    --resumeが指定されていれば既存のジャーナルに追記し、なければ新しいジャーナルを作る
+    NOTE: 同じ分に始まった別の実行のジャーナルに追記しないよう、新しいジャーナルは
+    使われていない名前(run_YYYYMMDDHHMM_2.jsonlなど)で排他的に作成する
+    """
+    if resume is not None:
+        if resume != "latest":
+            return StreamingOutputWriter(Path(resume), append=True)
+        journals = sorted(runs_dir.glob("run_*.jsonl"))
+        if journals:
+            return StreamingOutputWriter(journals[-1], append=True)
+        print("再開できるジャーナルが見つからないため、最初から実行します")
+
+    attempt = 1
+    while True:
+        suffix = "" if attempt == 1 else f"_{attempt}"
+        try:
+            return StreamingOutputWriter(runs_dir / f"run_{current_time}{suffix}.jsonl")
+        except FileExistsError:
+            attempt += 1
+
+
+def _load_url_mapping(mapping_path: Path):
     """
     url_mapping.jsonを読み込む
     """
     try:
-        mapping_path = current_dir / "url_mapping.json"
         with open(mapping_path, "r") as f:
             url_mapping = json.load(f)
         return url_mapping
     except Exception as e:
         print(e)
-        return {}
+        return []
+
+
+def _load_registry(mapping_path: Path) -> SpiderRegistry:
+    """
+    url_mapping.jsonからスパイダーのレジストリを作成する
+    """
+    return SpiderRegistry(_load_url_mapping(mapping_path))
 
 
-def _load_url_data():
+def _load_url_data(registry: SpiderRegistry, input_dir: Path):
     """
-    urlsのリストから、url_mappingのdomainを含むもののsite_nameとdictを返す
+    urlsのリストを、ホスト名に対応するsite_nameごとのdictに振り分けて返す
     インデックス情報を保持するように変更
     """
     loaded_urls = {}
-    url_items = _load_input_data()  # インデックスとURLのペアのリスト
 
     try:
-        url_mapping = _load_url_mapping()
-        for mapping in url_mapping:
-            loaded_urls[mapping["site_name"]] = []
-
-        for url_item in url_items:
-            found_match = False
-            for mapping in url_mapping:
-                if mapping["domain"] in url_item["url"]:
-                    loaded_urls[mapping["site_name"]].append(url_item)
-                    found_match = True
-                    break
-
+        # NOTE: 入力ファイルは1行ずつ読み、読んだそばからサイトに振り分ける
+        for url_item in iter_input_rows(input_dir):
             # サイト名が見つからない場合は "unknown" に分類
-            if not found_match:
-                if "unknown" not in loaded_urls:
-                    loaded_urls["unknown"] = []
-                loaded_urls["unknown"].append(url_item)
+            site_name = registry.route(url_item["url"]) or "unknown"
+            loaded_urls.setdefault(site_name, []).append(url_item)
 
     except Exception as e:
         print(e)
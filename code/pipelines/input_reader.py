@@ -0,0 +1,79 @@
+import csv
+import logging
+from pathlib import Path
+from typing import Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+def iter_input_rows(input_dir: Path) -> Iterator[dict]:
+    """
+    入力ファイル(入力.xlsx または 入力.csv)の1列目を1行ずつ読み、
+    {"index": 行番号(見出しを除いて0から), "url": URL} を順に返す
+
+    NOTE: ファイル全体をメモリに読み込まず、1行読むごとに返す
+    """
+    # Excelファイルが存在する場合はExcelから読み込む
+    excel_path = input_dir / "入力.xlsx"
+    if excel_path.exists():
+        cells = _iter_excel_cells(excel_path)
+    else:
+        # CSVファイルが存在する場合はCSVから読み込む
+        csv_path = input_dir / "入力.csv"
+        if not csv_path.exists():
+            print("入力ファイルが見つかりません")
+            return
+        cells = _iter_csv_cells(csv_path)
+
+    for index, url in enumerate(_drop_trailing_blanks(cells)):
+        yield {"index": index, "url": url}
+
+
+def _iter_excel_cells(path: Path) -> Iterator:
+    """
+    Excelの最初のシートの1列目を見出し行を除いて返す
+    """
+    # NOTE: openpyxlは重いため、Excelを読むときに初めてimportする
+    from openpyxl import load_workbook
+
+    # NOTE: read_onlyではセルを1行ずつ読み出すため、行数が多くてもメモリを使わない
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(min_row=2, max_col=1, values_only=True)
+        for row in rows:
+            yield row[0] if row else None
+    finally:
+        workbook.close()
+
+
+def _iter_csv_cells(path: Path) -> Iterator:
+    """
+    CSVの1列目を見出し行を除いて返す(空行は読み飛ばす)
+    """
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if not row:
+                continue
+            yield row[0] or None
+
+
+def _drop_trailing_blanks(cells: Iterable) -> Iterator:
+    """
+    空欄のセルはNoneにして返す。ただし末尾に続く空欄は返さない
+
+    NOTE: Excelは書式だけ残った空行を末尾に含むことがあるため、
+    空欄は次に値のあるセルが来るまで保留する
+    """
+    pending_blanks = 0
+    for cell in cells:
+        if isinstance(cell, str):
+            cell = cell.strip() or None
+        if cell is None:
+            pending_blanks += 1
+            continue
+        for _ in range(pending_blanks):
+            yield None
+        pending_blanks = 0
+        yield cell
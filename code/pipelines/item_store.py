@@ -0,0 +1,245 @@
+import csv
+import json
+import os
+import time
+import sqlite3
+import threading
+import logging
+from datetime import datetime
+from pathlib import Path
+from spiders._item_status import (
+    STATUS_ACTIVE,
+    STATUS_COLUMN,
+    STATUS_ENDED,
+    STATUS_SOLD,
+    item_status,
+)
+
+logger = logging.getLogger(__name__)
+
+# NOTE: 取得できた結果(data)を保存する状態
+STATUSES_WITH_DATA = (STATUS_ACTIVE, STATUS_SOLD)
+
+# 価格変動レポートの列
+PRICE_CHANGE_COLUMNS = [
+    "site",
+    "item_id",
+    "url",
+    "old_price",
+    "new_price",
+    "difference",
+    "changed_at",
+]
+
+
+class ItemStore:
+    """
+    サイトと商品IDをキーに、これまでのスクレイピング結果を保存するSQLiteのストア
+
+    - 取得した結果は毎回upsertし、最後に取得した時刻と状態(active/sold/ended)を持つ
+    - 鮮度の期限内の結果はストアから返し、取り直さずに済ませる(--incremental)
+    - 終了・削除済み・売り切れの商品は期限まで取り直さない(ネガティブキャッシュ)
+    - 価格が前回と変わった商品はprice_changesに記録する
+    - upsertはbatch_size件ごとにまとめてコミットする(残りはclose/flushでコミットする)
+      NOTE: 並行クロールではon_item(イベントループのスレッド)から呼ばれるため、
+      1件ごとにコミット(fsync)すると取得中の全リクエストを待たせてしまう
+    """
+
+    def __init__(self, path: Path, batch_size: int = 20):
+        self.path = path
+        self.batch_size = batch_size
+        self.served = 0
+        self.settled = 0
+        self.upserted = 0
+        self.price_changes = 0
+        # コミットしていないupsertの件数
+        self._pending = 0
+        self._lock = threading.Lock()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # NOTE: WALならコミットごとのfsyncはチェックポイントまで遅らせられる
+        # (落ちても失うのは最後のコミットだけで、DBは壊れない)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS items (
+                site TEXT NOT NULL,
+                item_id TEXT NOT NULL,
+                url TEXT NOT NULL,
+                status TEXT NOT NULL,
+                price INTEGER,
+                data TEXT,
+                scraped_at REAL NOT NULL,
+                PRIMARY KEY (site, item_id)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_items_scraped_at ON items (scraped_at)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_items_status ON items (status)"
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS price_changes (
+                site TEXT NOT NULL,
+                item_id TEXT NOT NULL,
+                url TEXT NOT NULL,
+                old_price INTEGER NOT NULL,
+                new_price INTEGER NOT NULL,
+                changed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_price_changes_changed_at ON price_changes (changed_at)"
+        )
+        self._conn.commit()
+
+    def lookup_fresh(self, site: str, item_id: str, max_age: float) -> dict | None:
+        """
+        max_age秒以内に取得できた商品の結果を返す(なければNone)
+        """
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT data FROM items
+                WHERE site = ? AND item_id = ? AND status = ? AND scraped_at >= ?
+                """,
+                (site, item_id, STATUS_ACTIVE, time.time() - max_age),
+            ).fetchone()
+            if row is None:
+                return None
+            self.served += 1
+        return json.loads(row[0])
+
+    def lookup_settled(self, site: str, item_id: str, max_age: float) -> dict | None:
+        """
+        max_age秒以内に終了・削除済み・売り切れと記録された商品の結果を返す(なければNone)
+
+        売り切れの商品は最後に取得できた内容を、終了・削除済みの商品は状態だけを返す
+        """
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT status, data FROM items
+                WHERE site = ? AND item_id = ? AND status IN (?, ?) AND scraped_at >= ?
+                """,
+                (site, item_id, STATUS_ENDED, STATUS_SOLD, time.time() - max_age),
+            ).fetchone()
+            if row is None:
+                return None
+            self.settled += 1
+        status, data = row
+        return {**(json.loads(data) if data else {}), STATUS_COLUMN: status}
+
+    def upsert(self, site: str, item_id: str, item: dict) -> None:
+        """
+        スクレイピング結果を保存する
+
+        NOTE: 再試行すれば取れるかもしれないエラーの結果は保存しない(前回の結果を残す)
+        """
+        status = item_status(item)
+        if status not in (*STATUSES_WITH_DATA, STATUS_ENDED):
+            return
+
+        price = None
+        data = None
+        if status in STATUSES_WITH_DATA:
+            price = item.get("price")
+            data = json.dumps(item, ensure_ascii=False, default=str)
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT price FROM items WHERE site = ? AND item_id = ?",
+                (site, item_id),
+            ).fetchone()
+            if old is not None and _is_price_change(old[0], price):
+                self._conn.execute(
+                    """
+                    INSERT INTO price_changes
+                        (site, item_id, url, old_price, new_price, changed_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    (site, item_id, item["original_url"], old[0], price, now),
+                )
+                self.price_changes += 1
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO items
+                    (site, item_id, url, status, price, data, scraped_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (site, item_id, item["original_url"], status, price, data, now),
+            )
+            self.upserted += 1
+            self._pending += 1
+            if self._pending >= self.batch_size:
+                self._commit()
+
+    def flush(self) -> None:
+        """
+        コミットしていないupsertをコミットする
+        """
+        with self._lock:
+            self._commit()
+
+    def _commit(self) -> None:
+        # NOTE: ロック内で呼ぶ
+        if self._pending:
+            self._conn.commit()
+            self._pending = 0
+
+    def export_price_changes(self, csv_path: Path, since: float) -> int:
+        """
+        since以降に記録した価格の変動をCSVに出力する
+
+        Returns:
+            int: 出力した行数
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT site, item_id, url, old_price, new_price, changed_at
+                FROM price_changes WHERE changed_at >= ?
+                ORDER BY site, item_id, changed_at
+                """,
+                (since,),
+            ).fetchall()
+        with open(csv_path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f, lineterminator=os.linesep)
+            writer.writerow(PRICE_CHANGE_COLUMNS)
+            for site, item_id, url, old_price, new_price, changed_at in rows:
+                writer.writerow(
+                    [
+                        site,
+                        item_id,
+                        url,
+                        old_price,
+                        new_price,
+                        new_price - old_price,
+                        datetime.fromtimestamp(changed_at).isoformat(timespec="seconds"),
+                    ]
+                )
+        logger.info(f"Exported {len(rows)} price changes to {csv_path}")
+        return len(rows)
+
+    def log_stats(self) -> None:
+        logger.info(
+            f"Item store: {self.served} served from store, "
+            f"{self.settled} skipped as ended/sold, {self.upserted} upserted, "
+            f"{self.price_changes} price changes"
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._commit()
+            self._conn.close()
+
+
+def _is_price_change(old_price, new_price) -> bool:
+    # NOTE: どちらかが不明(取得失敗・終了済み)の場合は変動として扱わない
+    return old_price is not None and new_price is not None and old_price != new_price
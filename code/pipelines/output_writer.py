@@ -0,0 +1,308 @@
+import os
+import csv
+import json
+import threading
+import logging
+from pathlib import Path
+from spiders._retry import PERMANENT_ERRORS
+from spiders._item_status import (
+    ERROR_COLUMN,
+    STATUS_COLUMN,
+    item_status,
+)
+from spiders._scraped_item import merged_info
+
+logger = logging.getLogger(__name__)
+
+# 出力CSVのインデックス列
+INDEX_COLUMN = "original_index"
+
+# NOTE: 再実行しても結果が変わらないエラー(--resumeでも取り直さない)
+NON_RETRYABLE_ERRORS = PERMANENT_ERRORS
+
+# 出力の列と型(この順番で出力する)
+# - "int": 整数(空欄を許す。Parquet/Featherではint64)
+# - "category": 値の種類が少ない文字列(Parquet/Featherでは辞書型)
+# - "str": 文字列
+OUTPUT_SCHEMA = [
+    ("image_urls", "str"),  # A列.商品画像
+    ("original_url", "str"),  # B列.URL
+    ("price", "int"),  # C列.商品価格
+    ("shipping_fee", "int"),  # 送料
+    ("total_price", "int"),  # 送料込みの価格
+    ("shipping_region", "category"),  # 発送元の地域
+    ("title", "str"),  # D列.商品タイトル
+    ("description", "str"),  # E列.商品説明文
+    ("condition", "str"),  # F列.商品状態説明文
+    ("merged_info", "str"),  # H列 D列目~F列目を改行で区切ってドッキングしたもの
+    (STATUS_COLUMN, "category"),  # 商品の状態(active/sold/ended/error/unsupported)
+]
+
+# 出力の列名
+OUTPUT_COLUMNS = [column for column, _ in OUTPUT_SCHEMA]
+
+# Parquet/Featherで出力するときの圧縮形式のデフォルト
+DEFAULT_COLUMNAR_COMPRESSION = "zstd"
+
+
+class StreamingOutputWriter:
+    """
+    スクレイピング結果を1件ずつJSONLファイルに追記するライター
+
+    - 結果はbatch_size件ごとにディスクへ書き出してfsyncする(途中で落ちても書いた分は残る)
+    - 全件をメモリに溜めないので、入力件数が増えてもメモリ使用量は変わらない
+    - 最後にJSONLからoriginal_index順のCSVを組み立てる
+    - スレッドセーフなので、複数のスパイダーから同時に書き込める
+    """
+
+    def __init__(self, journal_path: Path, batch_size: int = 20, append: bool = False):
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.written_count = 0
+        self._buffer: list[str] = []
+        self._lock = threading.Lock()
+
+        journal_path.parent.mkdir(parents=True, exist_ok=True)
+        # NOTE: 既存のジャーナルに追記するのは再開(append)のときだけ。
+        # 新しいジャーナルは"x"で開き、同じ名前のファイルがあればFileExistsErrorにする
+        self._file = open(journal_path, "a" if append else "x", encoding="utf-8")
+        # NOTE: 前回の実行が行の途中で落ちていた場合、続きの行がつながらないよう改行しておく
+        if (
+            append
+            and journal_path.stat().st_size > 0
+            and not _ends_with_newline(journal_path)
+        ):
+            self._file.write("\n")
+
+    def write(self, item: dict) -> None:
+        """
+        結果を1件追加する
+        """
+        line = json.dumps(item, ensure_ascii=False, default=str)
+        with self._lock:
+            self._buffer.append(line)
+            self.written_count += 1
+            if len(self._buffer) >= self.batch_size:
+                self._flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush()
+            self._file.close()
+
+    def _flush(self) -> None:
+        """
+        バッファをファイルに書き出す(ロック内で呼ぶ)
+        """
+        if not self._buffer:
+            return
+        self._file.write("\n".join(self._buffer) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._buffer.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def export_csv(self, csv_path: Path) -> int:
+        """
+        JSONLからoriginal_index順に並べたCSVを作成する
+
+        Returns:
+            int: 出力した行数
+        """
+        count = 0
+        with open(csv_path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f, lineterminator=os.linesep)
+            writer.writerow([INDEX_COLUMN, *OUTPUT_COLUMNS])
+            for row in self._iter_output_rows():
+                writer.writerow([_format_cell(value) for value in row])
+                count += 1
+        logger.info(f"Exported {count} rows to {csv_path}")
+        return count
+
+    def export_columnar(
+        self,
+        path: Path,
+        file_format: str,
+        compression: str = DEFAULT_COLUMNAR_COMPRESSION,
+        batch_size: int = 10000,
+    ) -> int:
+        """
+        JSONLからoriginal_index順に並べたParquet/Featherファイルを作成する(要pyarrow)
+
+        価格の列はint64(空欄はnull)、発送元の地域は辞書型で出力する
+
+        Returns:
+            int: 出力した行数
+        """
+        # NOTE: pyarrowは任意の依存なので、使うときに初めてimportする
+        import pyarrow as pa
+
+        schema = _arrow_schema(pa)
+        batches = self._iter_record_batches(pa, schema, batch_size)
+        count = 0
+        if file_format == "parquet":
+            import pyarrow.parquet as pq
+
+            # NOTE: pyarrowのParquetでは無圧縮を"uncompressed"ではなく"none"で指定する
+            if compression == "uncompressed":
+                compression = "none"
+            # NOTE: Parquetはバッチごとに書き出せるので、全件をメモリに持たない
+            with pq.ParquetWriter(path, schema, compression=compression) as writer:
+                for batch in batches:
+                    writer.write_batch(batch)
+                    count += batch.num_rows
+        elif file_format == "feather":
+            import pyarrow.feather as feather
+
+            # NOTE: Featherは辞書型の辞書をファイル全体で1つにそろえる必要があるため、
+            # 列形式のテーブルにまとめてから書き出す
+            table = pa.Table.from_batches(list(batches), schema).unify_dictionaries()
+            feather.write_feather(table, path, compression=compression)
+            count = table.num_rows
+        else:
+            raise ValueError(f"Unknown columnar format: {file_format}")
+        logger.info(f"Exported {count} rows to {path}")
+        return count
+
+    def _iter_record_batches(self, pa, schema, batch_size: int):
+        """
+        出力行をbatch_size行ずつのRecordBatchにして返す
+        """
+        columns = [[] for _ in schema.names]
+        for row in self._iter_output_rows():
+            for column, value in zip(columns, row):
+                column.append(value)
+            if len(columns[0]) >= batch_size:
+                yield pa.RecordBatch.from_arrays(columns, schema=schema)
+                columns = [[] for _ in schema.names]
+        if columns[0]:
+            yield pa.RecordBatch.from_arrays(columns, schema=schema)
+
+    def _iter_output_rows(self):
+        """
+        original_index順に、出力する列の値を型をそろえて返す
+
+        NOTE: メモリに持つのは(original_index, 行の位置)だけで、各行は都度読み直す
+        同じoriginal_indexの行が複数ある場合は後から書かれたものを使う
+        """
+        offsets = self._index_offsets()
+        with open(self.journal_path, "rb") as journal:
+            for index in sorted(offsets, key=_sort_key):
+                journal.seek(offsets[index])
+                item = json.loads(journal.readline())
+                yield [
+                    _coerce(index, "int"),
+                    *(
+                        _coerce(_column_value(item, column), kind)
+                        for column, kind in OUTPUT_SCHEMA
+                    ),
+                ]
+
+    def completed_keys(self) -> set[tuple]:
+        """
+        ジャーナルに記録済みで、取り直す必要のない(original_index, URL)の一覧を返す
+
+        成功した行と、再実行しても結果が変わらないエラーの行が対象。
+        同じoriginal_indexの行が複数ある場合は後から書かれたものを使う
+        """
+        latest = {}
+        for _, item in self._iter_journal():
+            latest[item.get(INDEX_COLUMN)] = item
+        return {
+            (index, item.get("original_url"))
+            for index, item in latest.items()
+            if item.get(ERROR_COLUMN) in (None, *NON_RETRYABLE_ERRORS)
+        }
+
+    def _index_offsets(self) -> dict:
+        """
+        original_indexごとに、JSONL内で最後に出てくる行の位置を返す
+        """
+        return {
+            item.get(INDEX_COLUMN): offset for offset, item in self._iter_journal()
+        }
+
+    def _iter_journal(self):
+        """
+        ジャーナルの各行を(行の位置, 結果)の組で返す
+        """
+        with open(self.journal_path, "rb") as journal:
+            offset = journal.tell()
+            for line in iter(journal.readline, b""):
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    # NOTE: 書き込み途中で落ちた最終行などは読み飛ばす
+                    logger.warning(f"Skipping broken line at byte {offset} in {self.journal_path}")
+                else:
+                    yield offset, item
+                offset = journal.tell()
+
+
+def _ends_with_newline(path: Path) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def _sort_key(index):
+    # NOTE: インデックスが無い行(None)は最後に回す
+    return (index is None, index if index is not None else 0)
+
+
+def _arrow_schema(pa):
+    """
+    OUTPUT_SCHEMAに対応するpyarrowのスキーマを返す
+    """
+    arrow_types = {
+        "int": pa.int64(),
+        "category": pa.dictionary(pa.int32(), pa.string()),
+        "str": pa.string(),
+    }
+    return pa.schema(
+        [pa.field(INDEX_COLUMN, pa.int64())]
+        + [pa.field(column, arrow_types[kind]) for column, kind in OUTPUT_SCHEMA]
+    )
+
+
+def _column_value(item: dict, column: str):
+    # NOTE: status列はエラーの種類などから導く
+    if column == STATUS_COLUMN:
+        return item_status(item)
+    # NOTE: merged_infoはジャーナルに書かず、出力するときに作る(以前のジャーナルの値はそのまま使う)
+    if column == "merged_info" and column not in item:
+        return merged_info(item)
+    return item.get(column)
+
+
+def _coerce(value, kind: str):
+    """
+    値を列の型にそろえる(変換できない値はNone)
+    """
+    if value is None:
+        return None
+    if kind == "int":
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            logger.warning(f"Cannot convert {value!r} to int. Writing it as empty.")
+            return None
+    return str(value)
+
+
+def _format_cell(value) -> str:
+    """
+    CSVのセルに書く文字列に変換する(Noneは空欄)
+    """
+    if value is None:
+        return ""
+    return str(value)
@@ -1,7 +1,13 @@
 import re
-import time
 import html
+import asyncio
+import time
+import threading
+from collections import Counter
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable
+from urllib.parse import urlsplit
 from bs4 import BeautifulSoup as bs
 from exeptions.expeptions import (
     Http403AccessDeniedError,
@@ -9,20 +15,161 @@ from exeptions.expeptions import (
     Http410GoneError,
     Http301MovedPermanentlyException,
     Http302FoundException,
+    Http429TooManyRequestsException,
+    Http5xxServerError,
+)
+from spiders._rate_limiter import AdaptiveRateLimiter, rate_limiter
+from spiders._session_manager import SessionManager, session_manager
+from spiders._http_cache import HttpCache
+from spiders._http_archive import HttpArchive
+from spiders._html_parser import parse_html, resolve_parser_backend
+from spiders._session_manager import cache_dir
+from spiders._retry import RetryPolicy, retry_policy
+from spiders._run_metrics import RunMetrics, run_metrics, timed_phase
+from spiders._scraped_item import ScrapedItem
+from spiders._item_status import (
+    STATUS_ACTIVE,
+    STATUS_ENDED,
+    STATUS_ERROR,
+    STATUS_SOLD,
+    item_status,
 )
-from selenium import webdriver
-from tenacity import retry, stop_after_attempt, wait_exponential
 import logging
 
+if TYPE_CHECKING:
+    # NOTE: seleniumはブラウザを起動するときだけimportする(HTTPだけの実行を軽くするため)
+    from selenium import webdriver
+
 logger = logging.getLogger(__name__)
 
+# NOTE: tunedプロファイルでブロックするリクエスト(フォント・動画・画像・計測タグ)
+# 画像はダウンロードしないだけで、imgタグのsrc属性はDOMに残る
+BLOCKED_URL_PATTERNS = [
+    "*.woff",
+    "*.woff2",
+    "*.ttf",
+    "*.otf",
+    "*.mp4",
+    "*.webm",
+    "*.m3u8",
+    "*.jpg",
+    "*.jpeg",
+    "*.png",
+    "*.gif",
+    "*.webp",
+    "*.svg",
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*googlesyndication.com*",
+    "*facebook.net*",
+    "*facebook.com/tr*",
+    "*criteo.*",
+    "*scorecardresearch.com*",
+    "*hotjar.com*",
+    "*karte.io*",
+    "*yimg.jp/images/listing/tool/yads*",
+]
+
 
 class BaseSpider:
-    def __init__(self, urls):
+    # クロールモード("async": 並行, "sequential": 逐次)
+    crawl_mode = "sequential"
+    # 全体の同時リクエスト数の上限
+    max_concurrency = 8
+    # 1ホストあたりの同時リクエスト数の上限
+    max_concurrency_per_host = 4
+    # ドメインごとのアクセス間隔を調整するレートリミッター(全スパイダーで共有)
+    rate_limiter: AdaptiveRateLimiter = rate_limiter
+    # warm-up済みのセッションとCookieを管理する(全スパイダーで共有)
+    session_manager: SessionManager = session_manager
+    # レスポンスのディスクキャッシュ(Noneなら使わない)
+    http_cache: HttpCache | None = None
+    # HTTPの記録・再生用のアーカイブ(Noneなら使わない)
+    http_archive: HttpArchive | None = None
+    # エラーの種類で再試行するかを決めるポリシー(全スパイダーで共有)
+    retry_policy: RetryPolicy = retry_policy
+    # URLごとのフェーズ別の時間・ドメインごとの応答時間を集計する(全スパイダーで共有)
+    metrics: RunMetrics = run_metrics
+    # 1リクエストのタイムアウト(秒)
+    request_timeout = 30.0
+    # HTMLパーサー(lxml / html.parser / html5lib)
+    parser_backend = "lxml"
+    # ブラウザのプロファイル("default": 素のChrome, "tuned": ヘッドレス・eager・リソースブロック)
+    browser_profile = "default"
+    # 商品URLを正規化するルール((商品IDを取り出す正規表現, 正規化後のURLの書式)のリスト)
+    item_url_patterns: list[tuple[re.Pattern, str]] = []
+    # 前回の結果を取り直さずに使う秒数(--incremental)
+    freshness_window = 24 * 60 * 60
+
+    def __init__(
+        self,
+        urls,
+        crawl_mode: str | None = None,
+        max_concurrency: int | None = None,
+        max_concurrency_per_host: int | None = None,
+        http_cache: HttpCache | None = None,
+        http_archive: HttpArchive | None = None,
+        parser_backend: str | None = None,
+        browser_profile: str | None = None,
+        on_item: Callable[[dict], None] | None = None,
+        retry_policy: RetryPolicy | None = None,
+        metrics: RunMetrics | None = None,
+    ):
         self.urls = urls
         self.request_count = 0
         self.session: requests.Session | None = None
-        self.last_access_success = False
+
+        if crawl_mode is not None:
+            self.crawl_mode = crawl_mode
+        if max_concurrency is not None:
+            self.max_concurrency = max_concurrency
+        if max_concurrency_per_host is not None:
+            self.max_concurrency_per_host = max_concurrency_per_host
+        if http_cache is not None:
+            self.http_cache = http_cache
+        if http_archive is not None:
+            self.http_archive = http_archive
+        self.parser_backend = resolve_parser_backend(
+            parser_backend or self.parser_backend
+        )
+        if browser_profile is not None:
+            self.browser_profile = browser_profile
+        if retry_policy is not None:
+            self.retry_policy = retry_policy
+        if metrics is not None:
+            self.metrics = metrics
+        # NOTE: 設定されていれば結果を1件ずつ渡し、スパイダー側では保持しない
+        self.on_item = on_item
+        self.emitted_count = 0
+        # 出力した結果の状態(active/sold/ended/error)ごとの件数
+        self.status_counts: Counter = Counter()
+        self._emit_lock = threading.Lock()
+
+    @classmethod
+    def canonicalize_url(cls, url: str) -> str:
+        """
+        URLから商品IDを取り出し、同じ商品なら同じになるURLを返す
+
+        トラッキング用のクエリやURLの表記ゆれを除くために使う。
+        どのルールにも合わない場合はフラグメントだけ除いたURLを返す
+        """
+        for pattern, canonical_format in cls.item_url_patterns:
+            match = pattern.search(url)
+            if match:
+                return canonical_format.format(*match.groups())
+        return url.split("#", 1)[0]
+
+    @classmethod
+    def item_id(cls, url: str) -> str:
+        """
+        URLから商品IDを返す(どのルールにも合わない場合は正規化したURL)
+        """
+        for pattern, _ in cls.item_url_patterns:
+            match = pattern.search(url)
+            if match:
+                return match.group(1)
+        return cls.canonicalize_url(url)
 
     @staticmethod
     def _load_headers() -> dict[str, str]:
@@ -41,117 +188,366 @@ class BaseSpider:
         }
         return headers
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=15),
-        reraise=True,
-    )
     def _get_html(
         self,
         url: str,
-        access_delay: float = 1.5,
         allow_redirects: bool = True,
         headers: dict = None,
     ) -> bs:
         """
         HTTPリクエストしてBeautifulSoupオブジェクトに変換する
         """
-        if self.request_count == 0 or not self.last_access_success:
-            bs = self._session_sp_request(url)
-            self.last_access_success = True
-            return bs
+        content = self._fetch(url, allow_redirects=allow_redirects, headers=headers)
+        return self._parse_html(content)
+
+    @timed_phase
+    def _parse_html(self, content: bytes) -> bs:
+        """
+        設定されたパーサーでBeautifulSoupオブジェクトに変換する
+        """
+        return parse_html(content, self.parser_backend)
+
+    def _fetch(
+        self,
+        url: str,
+        allow_redirects: bool = True,
+        headers: dict = None,
+    ) -> bytes:
+        """
+        HTTPリクエストしてレスポンスボディ(bytes)を返す
+
+        NOTE: ここでは再試行しない(再試行はスパイダーの_scrapeでretry_policyに従って行う)
+        """
+        # NOTE: TTL内のキャッシュがあればネットワークにアクセスしない
+        cached = self.http_cache.lookup(url) if self.http_cache is not None else None
+        if cached is not None and cached.is_fresh:
+            return cached.body
 
         self.request_count += 1
         if headers is None:
             headers = self._load_headers()
+        if cached is not None:
+            # NOTE: TTL切れのキャッシュはETag/Last-Modifiedで再検証する
+            headers = {**headers, **cached.conditional_headers()}
 
-        time.sleep(access_delay)
+        self.metrics.add_phase("rate_limit_wait", self.rate_limiter.acquire(url))
 
-        res = self.session.get(
-            url,
-            headers=headers,
-            allow_redirects=allow_redirects,
+        res = self._send(url, headers, allow_redirects=allow_redirects)
+        # NOTE: 429/403/5xxならレートを下げ、Retry-Afterの間は待機させる
+        self.rate_limiter.record(
+            url, res.status_code, res.headers.get("Retry-After")
         )
 
-        if res.status_code == 429:
-            retry_after = res.headers.get("Retry-After")
-            if retry_after:
-                logger.info(f"Retrying after {retry_after} seconds...")
-                time.sleep(int(retry_after))
-            else:
-                logger.info("Retry-After header not found.")
+        if res.status_code == 304 and cached is not None:
+            self.http_cache.revalidate(url)
+            return cached.body
 
-        if res.status_code == 403:
+        self._raise_for_status(url, res.status_code, res.content)
+
+        if self.http_cache is not None:
+            self.http_cache.store(
+                url,
+                res.content,
+                etag=res.headers.get("ETag"),
+                last_modified=res.headers.get("Last-Modified"),
+            )
+
+        return res.content
+
+    def _session_sp_request(self, url: str) -> bs:
+        """
+        sessionを使ってスクレイピングする
+        """
+        return self._parse_html(self._session_sp_fetch(url))
+
+    def _session_sp_fetch(self, url: str, allow_redirects: bool = True) -> bytes:
+        """
+        sessionを使ってレスポンスボディ(bytes)を取得する
+        """
+        # 目的のURLにアクセス
+        self.metrics.add_phase("rate_limit_wait", self.rate_limiter.acquire(url))
+        response = self._send(
+            url, self.session_manager.headers, allow_redirects=allow_redirects
+        )
+        self.rate_limiter.record(
+            url, response.status_code, response.headers.get("Retry-After")
+        )
+        self._raise_for_status(url, response.status_code, response.content)
+
+        return response.content
+
+    def _raise_for_status(self, url: str, status_code: int, content: bytes) -> None:
+        """
+        エラーのステータスコードを、RetryPolicyが再試行するかを判定できる例外にして投げる
+        """
+        if status_code == 429:
+            raise Http429TooManyRequestsException(url)
+
+        if status_code == 403:
+            # NOTE: Cookieが弾かれた可能性があるため、次のアクセスでwarm-upし直す
+            self.session_manager.invalidate()
             raise Http403AccessDeniedError(url)
 
-        if res.status_code == 404:
+        if status_code == 404:
             raise Http404NotFoundError(url)
 
-        if res.status_code == 410:
+        if status_code == 410:
             raise Http410GoneError(url)
 
-        if res.status_code == 301:
+        if status_code == 301:
             raise Http301MovedPermanentlyException(url)
 
-        if res.status_code == 302:
+        if status_code == 302:
             raise Http302FoundException(url)
 
-        if 300 <= res.status_code <= 599:
+        if 500 <= status_code <= 599:
+            raise Http5xxServerError(url, status_code)
+
+        if 300 <= status_code <= 599:
             raise Exception(
-                f"HTTP Error response {res.status_code} content: {res.content}"
+                f"HTTP Error response {status_code} content: {content}"
             )
 
-        soup = bs(res.content, "html.parser")
-        return soup
+    def _send(self, url: str, headers: dict, allow_redirects: bool = True):
+        """
+        GETリクエストを送ってレスポンスを返す
 
-    def _session_sp_request(self, url: str) -> bs:
+        http_archiveが再生モードならネットワークにアクセスせずアーカイブから返し、
+        記録モードならレスポンスをアーカイブに記録する
         """
-        sessionを使ってスクレイピングする
+        if self.http_archive is not None and self.http_archive.replaying:
+            started_at = time.perf_counter()
+            res = self.http_archive.replay(url)
+        else:
+            # NOTE: セッションは使い回し、warm-upは初回とCookie切れ・403の後だけ行われる
+            self.session = self.session_manager.get_session(
+                timeout=self.request_timeout
+            )
+            started_at = time.perf_counter()
+            res = self.session.get(
+                url,
+                headers=headers,
+                allow_redirects=allow_redirects,
+                timeout=self.request_timeout,
+            )
+            if self.http_archive is not None:
+                self.http_archive.record(url, res, headers)
+        self.metrics.record_fetch(
+            url, res.status_code, len(res.content), time.perf_counter() - started_at
+        )
+        return res
+
+    def run(self) -> list[ScrapedItem]:
         """
-        # セッションを作成してCookieを維持
-        session = requests.Session()
+        全URLをスクレイピングする(main.pyから呼ばれる)
 
-        # 日本のブラウザを模倣するヘッダー
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36",
-            "Accept-Language": "ja,en-US;q=0.9,en;q=0.8",
-            "Content-Language": "ja-JP",
-            "X-Forwarded-For": "126.0.0.1",  # 日本のIPを模倣
-            "Referer": "https://auctions.yahoo.co.jp/",
-            "Origin": "https://auctions.yahoo.co.jp",
-        }
+        結果は_emitでon_itemに渡す。on_itemが設定されていなければ結果のリストを返す
+        """
+        return self.crawl_urls()
 
-        # 日本の地域設定を示すCookie
-        cookies = {
-            "JP_LOCATION": "JP",
-            "locale": "ja_JP",
-            "country": "jp",
-            "language": "ja",
-            "region": "JP",
-        }
+    def crawl_urls(self) -> list[ScrapedItem]:
+        """
+        crawl_modeに従って全URLを_scrapeでスクレイピングし、1件ずつ_emitする
 
-        # Cookieをセッションに追加
-        self.cookies = cookies
-        session.cookies.update(cookies)
+        NOTE: 新しいスパイダーは_scrapeを実装すればよい(ブラウザのワーカーなど、
+        取得の仕方が違うスパイダーだけcrawl_urlsを上書きし、結果は必ず_emitに渡す)
+        """
+        if self.crawl_mode == "async":
+            scraped_data = asyncio.run(self.crawl_urls_async())
+            self._finish_crawl(len(self.urls))
+            return scraped_data
 
-        # 最初にメインページにアクセスして必要なCookieを取得
-        main_page_url = "https://auctions.yahoo.co.jp/"
-        session.get(main_page_url, headers=headers)
+        scraped_data = []
+        total_urls = len(self.urls)
+        for i, url in enumerate(self.urls, 1):
+            try:
+                logger.info(
+                    f"Scraping URL {i}/{total_urls} ({i/total_urls*100:.1f}%): {url}"
+                )
+                item = self._emit(self._scrape_tracked(url))
+                logger.info(
+                    f"Successfully scraped URL {i}/{total_urls} ({i/total_urls*100:.1f}%)"
+                )
+            except Exception as e:
+                item = self._emit(self._failed_item(url, e))
+                logger.error(
+                    f"Error scraping URL {i}/{total_urls} ({i/total_urls*100:.1f}%): {url} - {e}"
+                )
+            if item is not None:
+                scraped_data.append(item)
+        self._finish_crawl(total_urls)
+        return scraped_data
 
-        # 目的のURLにアクセス
-        response = session.get(url, headers=headers)
-        res_bs = bs(response.content, "html.parser")
-        self.session = session
+    def _scrape(self, url: str) -> ScrapedItem:
+        """
+        1つのURLをスクレイピングする(サイトごとのスパイダーで実装する)
+        """
+        raise NotImplementedError
+
+    async def crawl_urls_async(self) -> list[ScrapedItem]:
+        """
+        asyncioで複数URLを並行にスクレイピングする
 
-        return res_bs
+        全体の同時実行数はmax_concurrency、ホストごとの同時実行数は
+        max_concurrency_per_hostで制限する。
+        ブロッキングな_scrapeはスレッドプールで実行し、結果は入力順で返す。
+        (on_itemが設定されている場合は、終わった順にon_itemへ渡す)
+        """
+        total_urls = len(self.urls)
+        loop = asyncio.get_running_loop()
+        global_semaphore = asyncio.Semaphore(self.max_concurrency)
+        host_semaphores: dict[str, asyncio.Semaphore] = {}
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+
+        async def scrape_one(i: int, url: str) -> ScrapedItem | None:
+            host = urlsplit(url).hostname or ""
+            host_semaphore = host_semaphores.setdefault(
+                host, asyncio.Semaphore(self.max_concurrency_per_host)
+            )
+            # NOTE: ホスト枠を先に確保し、待機中に全体枠を占有しないようにする
+            async with host_semaphore, global_semaphore:
+                try:
+                    logger.info(
+                        f"Scraping URL {i}/{total_urls} ({i/total_urls*100:.1f}%): {url}"
+                    )
+                    scraped = await loop.run_in_executor(
+                        executor, self._scrape_tracked, url
+                    )
+                    logger.info(
+                        f"Successfully scraped URL {i}/{total_urls} ({i/total_urls*100:.1f}%)"
+                    )
+                    return self._emit(scraped)
+                except Exception as e:
+                    logger.error(
+                        f"Error scraping URL {i}/{total_urls} ({i/total_urls*100:.1f}%): {url} - {e}"
+                    )
+                    return self._emit(self._failed_item(url, e))
+
+        try:
+            scraped_data = await asyncio.gather(
+                *(scrape_one(i, url) for i, url in enumerate(self.urls, 1))
+            )
+        finally:
+            executor.shutdown(wait=False)
+        return [item for item in scraped_data if item is not None]
+
+    def _scrape_tracked(self, url: str) -> ScrapedItem:
+        """
+        _scrapeを実行し、そのURLのフェーズごとの時間をmetricsに記録する
+        """
+        with self.metrics.track(self.name, url):
+            return self._scrape(url)
+
+    @staticmethod
+    def _failed_item(url: str, error: Exception) -> ScrapedItem:
+        """
+        取得に失敗したURLの出力データを返す
+
+        NOTE: error_typeは--resumeで再取得するかどうかの判定に使う
+        """
+        return ScrapedItem(original_url=url, error_type=type(error).__name__)
 
-    def _load_selenium(self) -> webdriver.Chrome:
+    def _emit(self, item: ScrapedItem | dict) -> ScrapedItem | dict | None:
+        """
+        スクレイピング結果を1件出力する
+
+        on_itemが設定されていればジャーナルなどに書く形(dict)にしてその場で渡し、Noneを返す
+        (メモリに溜めない)。設定されていなければ受け取ったまま返す
+        NOTE: ScrapedItemを使っていないスパイダーのため、dictもそのまま受け付ける
+        """
+        row = item.to_dict() if isinstance(item, ScrapedItem) else dict(item)
+        self.metrics.record_item(self.name, row)
+        with self._emit_lock:
+            self.emitted_count += 1
+            self.status_counts[item_status(row)] += 1
+            if self.on_item is not None:
+                self.on_item(row)
+                return None
+        return item
+
+    def _log_crawl_summary(self, total_urls: int) -> None:
+        """
+        クロール結果のサマリーをログに出力する
+
+        NOTE: 失敗した行も出力するため、成功率は出力件数ではなく状態ごとの件数から求める
+        """
+        if total_urls == 0:
+            logger.info("No URLs to scrape.")
+            return
+        succeeded = self.status_counts[STATUS_ACTIVE] + self.status_counts[STATUS_SOLD]
+        success_rate = succeeded / total_urls * 100
+        logger.info(
+            f"Completed scraping {total_urls} URLs: {succeeded} succeeded, "
+            f"{self.status_counts[STATUS_ENDED]} ended, "
+            f"{self.status_counts[STATUS_ERROR]} failed ({success_rate:.1f}% success rate)"
+        )
+
+    def _finish_crawl(self, total_urls: int) -> None:
+        """
+        クロール終了時のログ出力と後処理を行う
+        """
+        self._log_crawl_summary(total_urls)
+        self._log_request_rates()
+        if self.http_cache is not None:
+            self.http_cache.log_stats()
+        if self.http_archive is not None:
+            self.http_archive.log_stats()
+        # NOTE: 次回の実行でwarm-upを省けるようにCookieを保存しておく
+        self.session_manager.save()
+
+    def _log_request_rates(self) -> None:
+        """
+        ドメインごとの現在のリクエストレートをログに出力する
+        """
+        for domain, rate in self.rate_limiter.current_rates().items():
+            logger.info(f"Request rate for {domain}: {rate:.2f} req/s")
+
+    def _load_selenium(self, profile: str | None = None) -> "webdriver.Chrome":
         """
         Seleniumを使ってページをロードする
         """
+        from selenium import webdriver
+
+        if (profile or self.browser_profile) == "tuned":
+            return self._load_tuned_selenium()
         driver = webdriver.Chrome()
         return driver
 
+    def _load_tuned_selenium(self) -> "webdriver.Chrome":
+        """
+        スクレイピング向けに調整したChromeを起動する
+
+        - ヘッドレス
+        - pageLoadStrategy=eager(DOMContentLoadedで制御を返す)
+        - 画像・動画・フォント・計測タグをブロック
+        - ディスクキャッシュを実行間で使い回す
+        """
+        from selenium import webdriver
+
+        # NOTE: 同時に動く複数のChromeで同じキャッシュを共有しないよう、スレッドごとに分ける
+        browser_cache_dir = cache_dir / "chrome" / threading.current_thread().name
+        browser_cache_dir.mkdir(parents=True, exist_ok=True)
+
+        options = webdriver.ChromeOptions()
+        options.page_load_strategy = "eager"
+        options.add_argument("--headless=new")
+        options.add_argument("--window-size=1920,1080")
+        options.add_argument(f"--disk-cache-dir={browser_cache_dir}")
+        options.add_experimental_option(
+            "prefs",
+            {
+                "profile.managed_default_content_settings.images": 2,
+                "profile.default_content_setting_values.notifications": 2,
+            },
+        )
+
+        driver = webdriver.Chrome(options=options)
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd(
+            "Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS}
+        )
+        return driver
+
     @staticmethod
     def clean_html_text(text: str) -> str:
         # HTMLエンティティを通常の文字に変換
@@ -0,0 +1,48 @@
+import logging
+from bs4 import BeautifulSoup as bs
+from bs4.builder import builder_registry
+
+logger = logging.getLogger(__name__)
+
+# 選択できるパーサー(BeautifulSoupのツリービルダー名)
+# - lxml: C実装で高速(要lxml)
+# - html.parser: Python標準ライブラリ(追加インストール不要だが遅い)
+# - html5lib: ブラウザと同じ解釈をするが最も遅い(要html5lib)
+PARSER_BACKENDS = ("lxml", "html.parser", "html5lib")
+
+# NOTE: どの環境でも使えるフォールバック先
+FALLBACK_PARSER_BACKEND = "html.parser"
+
+
+def available_parser_backends() -> list[str]:
+    """
+    インストール済みで使えるパーサーの一覧を返す
+    """
+    return [
+        backend
+        for backend in PARSER_BACKENDS
+        if builder_registry.lookup(backend) is not None
+    ]
+
+
+def resolve_parser_backend(backend: str) -> str:
+    """
+    パーサー名を検証し、使えない場合はhtml.parserにフォールバックする
+    """
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(
+            f"Unknown parser backend: {backend} (choose from {', '.join(PARSER_BACKENDS)})"
+        )
+    if builder_registry.lookup(backend) is None:
+        logger.warning(
+            f"Parser backend '{backend}' is not installed. Falling back to '{FALLBACK_PARSER_BACKEND}'."
+        )
+        return FALLBACK_PARSER_BACKEND
+    return backend
+
+
+def parse_html(content: bytes | str, backend: str) -> bs:
+    """
+    指定したパーサーでBeautifulSoupオブジェクトに変換する
+    """
+    return bs(content, backend)
@@ -0,0 +1,196 @@
+import json
+import time
+import zlib
+import sqlite3
+import threading
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from requests.structures import CaseInsensitiveDict
+
+from exeptions.expeptions import HttpArchiveMissError
+
+logger = logging.getLogger(__name__)
+
+RECORD_MODE = "record"
+REPLAY_MODE = "replay"
+
+
+@dataclass
+class ArchivedResponse:
+    """
+    アーカイブから再生したレスポンス(requests.Responseの代わりに使う属性だけを持つ)
+    """
+
+    url: str
+    status_code: int
+    headers: CaseInsensitiveDict
+    content: bytes
+    elapsed: float
+
+
+class HttpArchive:
+    """
+    HTTPのリクエストとレスポンスを記録し、ネットワークなしで再生するアーカイブ(SQLite)
+
+    - 記録モード: ステータス・ヘッダー・圧縮したボディと応答時間を1リクエストずつ保存する
+    - 再生モード: 記録したレスポンスを返す。同じURLが複数回記録されていれば記録した順に返し、
+      使い切ったら最後のものを返し続ける(429のあとに200、のような再試行も再現する)
+    - 再生時は記録した応答時間をspeedupで割った時間だけ待つ(latencyを指定すればその秒数)
+    - アーカイブに無いURLはmissingが"error"ならHttpArchiveMissError、
+      "cycle"なら同じホストの記録済みのレスポンスを使い回す(記録より多いURLで負荷試験するため)
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        mode: str = REPLAY_MODE,
+        speedup: float = 1.0,
+        latency: float | None = None,
+        missing: str = "error",
+    ):
+        self.path = path
+        self.mode = mode
+        self.speedup = speedup
+        self.latency = latency
+        self.missing = missing
+        self.recorded = 0
+        self.replayed = 0
+        self.cycled = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # 再生時のURLごとの記録のID(記録順)と、次に返す位置
+        self._entry_ids: dict[str, list[int]] | None = None
+        self._host_urls: dict[str, list[str]] = {}
+        self._cursors: dict[str, int] = {}
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS exchanges (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,
+                request_headers TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                elapsed REAL NOT NULL,
+                recorded_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_exchanges_url ON exchanges (url)"
+        )
+        self._conn.commit()
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY_MODE
+
+    def record(self, url: str, response, request_headers: dict | None = None) -> None:
+        """
+        requests.Responseを記録する
+        """
+        # NOTE: 304はHTTPキャッシュの本文と組み合わせないと再生できないため記録しない
+        if response.status_code == 304:
+            return
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO exchanges
+                    (url, request_headers, status, headers, body, elapsed, recorded_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    url,
+                    json.dumps(dict(request_headers or {}), ensure_ascii=False),
+                    response.status_code,
+                    json.dumps(dict(response.headers), ensure_ascii=False),
+                    zlib.compress(response.content),
+                    response.elapsed.total_seconds(),
+                    time.time(),
+                ),
+            )
+            self._conn.commit()
+            self.recorded += 1
+
+    def replay(self, url: str) -> ArchivedResponse:
+        """
+        URLに対して記録したレスポンスを、応答時間を再現してから返す
+        """
+        with self._lock:
+            entry_id = self._next_entry_id(url)
+            row = self._conn.execute(
+                "SELECT status, headers, body, elapsed FROM exchanges WHERE id = ?",
+                (entry_id,),
+            ).fetchone()
+            self.replayed += 1
+        status, headers, body, elapsed = row
+
+        delay = self.latency if self.latency is not None else elapsed / self.speedup
+        if delay > 0:
+            time.sleep(delay)
+
+        return ArchivedResponse(
+            url=url,
+            status_code=status,
+            headers=CaseInsensitiveDict(json.loads(headers)),
+            content=zlib.decompress(body),
+            elapsed=elapsed,
+        )
+
+    def _next_entry_id(self, url: str) -> int:
+        """
+        次に返す記録のIDを返す(ロック内で呼ぶ)
+        """
+        if self._entry_ids is None:
+            self._load_index()
+
+        archived_url = url
+        if url not in self._entry_ids:
+            host_urls = self._host_urls.get(urlsplit(url).hostname or "")
+            if self.missing != "cycle" or not host_urls:
+                self.misses += 1
+                raise HttpArchiveMissError(url)
+            # NOTE: 同じURLには毎回同じ記録を返す(crc32はプロセスをまたいでも同じ値)
+            archived_url = host_urls[zlib.crc32(url.encode()) % len(host_urls)]
+            self.cycled += 1
+
+        entry_ids = self._entry_ids[archived_url]
+        cursor = self._cursors.get(url, 0)
+        self._cursors[url] = cursor + 1
+        return entry_ids[min(cursor, len(entry_ids) - 1)]
+
+    def _load_index(self) -> None:
+        """
+        URLごとの記録のIDを読み込む(ボディは再生するときに1件ずつ読む)
+        """
+        self._entry_ids = {}
+        for entry_id, url in self._conn.execute(
+            "SELECT id, url FROM exchanges ORDER BY id"
+        ):
+            if url not in self._entry_ids:
+                self._entry_ids[url] = []
+                host = urlsplit(url).hostname or ""
+                self._host_urls.setdefault(host, []).append(url)
+            self._entry_ids[url].append(entry_id)
+        logger.info(
+            f"Loaded HTTP archive {self.path.name}: {len(self._entry_ids)} URLs"
+        )
+
+    def log_stats(self) -> None:
+        if self.replaying:
+            logger.info(
+                f"HTTP archive: {self.replayed} replayed "
+                f"({self.cycled} served from other URLs), {self.misses} not in archive"
+            )
+        else:
+            logger.info(f"HTTP archive: {self.recorded} responses recorded")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
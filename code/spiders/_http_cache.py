@@ -0,0 +1,199 @@
+import time
+import zlib
+import sqlite3
+import threading
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedResponse:
+    """
+    キャッシュされたレスポンス
+    """
+
+    url: str
+    body: bytes
+    etag: str | None
+    last_modified: str | None
+    stored_at: float
+    is_fresh: bool
+
+    def conditional_headers(self) -> dict[str, str]:
+        """
+        再検証(条件付きリクエスト)用のヘッダーを返す
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """
+    URLをキーにしたディスク上のHTTPレスポンスキャッシュ
+
+    - TTL以内のレスポンスはネットワークにアクセスせずに返す
+    - TTLを過ぎていてもETag/Last-Modifiedがあれば条件付きリクエストで再検証する
+    - 合計サイズがmax_bytesを超えたら、最後に使われたのが古い順に削除する(LRU)
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        ttl: float = 6 * 60 * 60,
+        max_bytes: int = 500 * 1024 * 1024,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses (accessed_at)"
+        )
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    def lookup(self, url: str) -> CachedResponse | None:
+        """
+        キャッシュを探す
+
+        TTL切れで再検証もできないエントリはNoneを返す
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, etag, last_modified, stored_at FROM responses WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            body, etag, last_modified, stored_at = row
+            is_fresh = now - stored_at < self.ttl
+            if not is_fresh and not etag and not last_modified:
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE url = ?", (now, url)
+            )
+            self._conn.commit()
+            if is_fresh:
+                self.hits += 1
+        return CachedResponse(
+            url=url,
+            body=zlib.decompress(body),
+            etag=etag,
+            last_modified=last_modified,
+            stored_at=stored_at,
+            is_fresh=is_fresh,
+        )
+
+    def revalidate(self, url: str) -> None:
+        """
+        304 Not Modifiedを受けたエントリの保存時刻を更新する
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET stored_at = ?, accessed_at = ? WHERE url = ?",
+                (now, now, url),
+            )
+            self._conn.commit()
+            self.revalidated += 1
+
+    def store(
+        self,
+        url: str,
+        body: bytes,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> None:
+        """
+        レスポンスを保存し、上限サイズを超えていれば古いものから削除する
+        """
+        now = time.time()
+        compressed = zlib.compress(body)
+        with self._lock:
+            self.misses += 1
+            old = self._conn.execute(
+                "SELECT size FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if old is not None:
+                self._total_bytes -= old[0]
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO responses
+                    (url, body, etag, last_modified, stored_at, accessed_at, size)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (url, compressed, etag, last_modified, now, now, len(compressed)),
+            )
+            self._total_bytes += len(compressed)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """
+        合計サイズがmax_bytes以下になるまでLRUで削除する(ロック内で呼ぶ)
+        """
+        if self._total_bytes <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT url, size FROM responses ORDER BY accessed_at ASC"
+        ).fetchall()
+        evicted = []
+        for url, size in rows:
+            if self._total_bytes <= self.max_bytes:
+                break
+            evicted.append((url,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM responses WHERE url = ?", evicted)
+        logger.info(f"Evicted {len(evicted)} entries from HTTP cache")
+
+    def stats(self) -> dict[str, int]:
+        """
+        キャッシュのヒット・ミス件数を返す
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+                "bytes": self._total_bytes,
+            }
+
+    def log_stats(self) -> None:
+        stats = self.stats()
+        logger.info(
+            f"HTTP cache: {stats['hits']} hits, {stats['revalidated']} revalidated (304), "
+            f"{stats['misses']} misses, {stats['bytes'] / 1024 / 1024:.1f} MB on disk"
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,39 @@
+from spiders._retry import PERMANENT_ERRORS
+
+# 取得に失敗した行に入るエラーの種類(例外クラス名)
+ERROR_COLUMN = "error_type"
+
+# 商品の状態(出力のstatus列)
+STATUS_COLUMN = "status"
+
+# 対応するスパイダーがないサイトの行に入るエラー
+# NOTE: スパイダーを追加したあとに--resumeで取り直せるよう、再試行できる扱いにする
+UNSUPPORTED_SITE_ERROR = "UnsupportedSiteError"
+
+# - active: 取得できた(出品中)
+# - sold: 取得できたが売り切れ
+# - ended: 404/410/リダイレクトで取得できなかった(終了・削除済み)
+# - error: 一時的なエラーなどで取得できなかった
+# - unsupported: 対応するスパイダーがない
+STATUS_ACTIVE = "active"
+STATUS_SOLD = "sold"
+STATUS_ENDED = "ended"
+STATUS_ERROR = "error"
+STATUS_UNSUPPORTED = "unsupported"
+
+
+def item_status(item: dict) -> str:
+    """
+    スクレイピング結果から商品の状態を返す
+    """
+    status = item.get(STATUS_COLUMN)
+    if status:
+        return status
+    error_type = item.get(ERROR_COLUMN)
+    if error_type is None:
+        return STATUS_ACTIVE
+    if error_type in PERMANENT_ERRORS:
+        return STATUS_ENDED
+    if error_type == UNSUPPORTED_SITE_ERROR:
+        return STATUS_UNSUPPORTED
+    return STATUS_ERROR
@@ -0,0 +1,214 @@
+import sys
+import time
+import threading
+import tracemalloc
+import logging
+from collections import Counter
+from pathlib import Path
+
+from spiders._run_metrics import RunMetrics
+
+logger = logging.getLogger(__name__)
+
+# spiders/ディレクトリ(サイトごとの割り当ての絞り込みに使う)
+spiders_dir = Path(__file__).parent
+
+
+class RunProfiler:
+    """
+    クロール中のスタックを定期的にサンプリングし、メモリの割り当てを追跡するプロファイラー(--profile)
+
+    - スクレイピング中のスレッド(RunMetrics.trackの中)のスタックだけを一定間隔で記録する
+      (待機中のスレッドプールなどは数えない)。壁時計時間のサンプリングなので、
+      CPUを使う処理(パース・抽出)も、待ち(レート制限・通信・Seleniumの待機)も同じように現れる
+    - NOTE: cProfileはスレッドごとにしか計測できず(3.12以降は同時に1つしか有効にできない)、
+      並行クロールの全スレッドを計測できないため、サンプリングにしている
+    - tracemallocで割り当てを追跡し、使用量が増えたときのスナップショットから
+      割り当ての多い箇所を全体とスパイダーごとに出す
+      NOTE: tracemallocはトレースバックが深いほど遅くなる(1フレームでもパースが数倍遅くなる)。
+      既定の1フレームではスパイダーのコードが直接割り当てた分だけがスパイダーに紐づくので、
+      ライブラリ(bs4など)の中の割り当てまで紐づけたいときはframesを深くする
+    """
+
+    # スタックを記録する間隔(秒)
+    sample_interval = 0.01
+    # メモリの使用量を確認する間隔(秒)
+    memory_check_interval = 1.0
+    # 前回のスナップショットから何倍に増えたら取り直すか
+    snapshot_growth = 1.2
+    # tracemallocで記録するトレースバックの深さ
+    tracemalloc_frames = 1
+
+    def __init__(self, metrics: RunMetrics, top: int = 20, frames: int | None = None):
+        self.metrics = metrics
+        self.top = top
+        if frames is not None:
+            self.tracemalloc_frames = frames
+        self.samples = 0
+        # (ファイル名, 行番号, 関数名) -> スタックの先頭にあった回数 / スタックに含まれていた回数
+        self.self_counts: Counter = Counter()
+        self.cumulative_counts: Counter = Counter()
+        self.site_samples: Counter = Counter()
+        self.peak_snapshot: tracemalloc.Snapshot | None = None
+        self.peak_traced_bytes = 0
+        # スナップショットを取ったときの割り当て済みのバイト数
+        self._snapshot_bytes = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        tracemalloc.start(self.tracemalloc_frames)
+        self._thread = threading.Thread(
+            target=self._run, name="profiler", daemon=True
+        )
+        self._thread.start()
+        logger.info(
+            f"Profiling: sampling stacks every {self.sample_interval * 1000:.0f}ms "
+            "and tracing allocations (the run will be slower)"
+        )
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._check_memory()
+        self.peak_traced_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    def _run(self) -> None:
+        next_memory_check = time.monotonic()
+        while not self._stop.wait(self.sample_interval):
+            self._sample()
+            if time.monotonic() >= next_memory_check:
+                self._check_memory()
+                next_memory_check = time.monotonic() + self.memory_check_interval
+
+    def _sample(self) -> None:
+        """
+        スクレイピング中の各スレッドのスタックを1回記録する
+        """
+        active_sites = self.metrics.active_sites()
+        if not active_sites:
+            return
+        frames = sys._current_frames()
+        for thread_id, site in active_sites.items():
+            frame = frames.get(thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            self.site_samples[site] += 1
+            self.self_counts[_frame_key(frame)] += 1
+            # NOTE: 再帰で同じ関数が何度も現れても、1サンプルにつき1回だけ数える
+            seen = set()
+            while frame is not None:
+                key = _frame_key(frame)
+                if key not in seen:
+                    seen.add(key)
+                    self.cumulative_counts[key] += 1
+                frame = frame.f_back
+
+    def _check_memory(self) -> None:
+        """
+        割り当て済みのメモリが前回のスナップショットより十分増えていれば取り直す
+        """
+        if not tracemalloc.is_tracing():
+            return
+        current, _ = tracemalloc.get_traced_memory()
+        if self._snapshot_bytes and current < self._snapshot_bytes * self.snapshot_growth:
+            return
+        self._snapshot_bytes = current
+        self.peak_snapshot = tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ]
+        )
+
+    def write_report(self, path: Path, summary: dict) -> None:
+        """
+        遅かったURL(フェーズの内訳つき)、時間のかかった関数、割り当ての多い箇所をテキストで書き出す
+        """
+        lines = [f"Profile of run started at {summary['started_at']}", ""]
+        lines += self._slowest_urls_section(summary["urls"])
+        lines += self._hot_functions_section()
+        lines += self._allocations_section()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        logger.info(f"Wrote profile report to {path}")
+
+    def _slowest_urls_section(self, records: list[dict]) -> list[str]:
+        lines = [f"## Slowest {self.top} URLs", ""]
+        slowest = sorted(records, key=lambda record: record["seconds"], reverse=True)
+        for record in slowest[: self.top]:
+            lines.append(
+                f"{record['seconds']:8.2f}s  {record['site']}  {record['status']}  "
+                f"retries={record['retries']}  {record['url']}"
+            )
+            phases = sorted(record["phases"].items(), key=lambda item: -item[1])
+            for name, seconds in phases:
+                lines.append(f"{'':12}{seconds:8.3f}s  {name}")
+        lines.append("")
+        return lines
+
+    def _hot_functions_section(self) -> list[str]:
+        lines = [
+            f"## Hottest functions ({self.samples} samples every "
+            f"{self.sample_interval * 1000:.0f}ms; "
+            + ", ".join(f"{site}: {count}" for site, count in self.site_samples.items())
+            + ")",
+            "",
+        ]
+        if self.samples == 0:
+            return lines + ["(no samples)", ""]
+        for title, counts in (
+            ("self (on top of the stack)", self.self_counts),
+            ("cumulative (anywhere on the stack)", self.cumulative_counts),
+        ):
+            lines.append(f"### {title}")
+            for key, count in counts.most_common(self.top):
+                lines.append(
+                    f"{count / self.samples:7.1%}  "
+                    f"{count * self.sample_interval:8.2f}s  {_format_key(key)}"
+                )
+            lines.append("")
+        return lines
+
+    def _allocations_section(self) -> list[str]:
+        lines = [
+            f"## Biggest allocation sites (peak traced memory "
+            f"{self.peak_traced_bytes / 1024 / 1024:.1f} MB, "
+            f"traceback depth {self.tracemalloc_frames})",
+            "",
+        ]
+        if self.peak_snapshot is None:
+            return lines + ["(no snapshot)", ""]
+        lines += ["### all", *self._format_statistics(self.peak_snapshot), ""]
+        for site in self.site_samples:
+            # NOTE: トレースバックのどこかにそのスパイダーのファイルを含む割り当てに絞る
+            site_snapshot = self.peak_snapshot.filter_traces(
+                [
+                    tracemalloc.Filter(
+                        True, str(spiders_dir / site / "*"), all_frames=True
+                    )
+                ]
+            )
+            lines += [f"### {site}", *self._format_statistics(site_snapshot), ""]
+        return lines
+
+    def _format_statistics(self, snapshot: tracemalloc.Snapshot) -> list[str]:
+        return [
+            f"{stat.size / 1024:10.1f} KB  {stat.count:8d} blocks  "
+            f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}"
+            for stat in snapshot.statistics("lineno")[: self.top]
+        ]
+
+
+def _frame_key(frame) -> tuple[str, int, str]:
+    code = frame.f_code
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+def _format_key(key: tuple[str, int, str]) -> str:
+    filename, lineno, name = key
+    return f"{name} ({filename}:{lineno})"
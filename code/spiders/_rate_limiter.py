@@ -0,0 +1,158 @@
+import time
+import threading
+import logging
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+class _DomainBucket:
+    """
+    1ドメイン分のトークンバケットの状態
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate  # 1秒あたりに補充されるトークン数(=リクエスト数)
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        # Retry-Afterなどで指定された再開時刻(monotonic)
+        self.blocked_until = 0.0
+
+    def refill(self, now: float) -> None:
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+
+class AdaptiveRateLimiter:
+    """
+    ドメインごとのトークンバケットでリクエスト間隔を制御するレートリミッター
+
+    2xx(と304)が返るたびにレートを加算的に上げ(additive increase)、
+    429/403/5xxが返るとレートを乗算的に下げる(multiplicative decrease)。
+    Retry-Afterヘッダーがあれば、その時刻までそのドメインへのリクエストを止める。
+    スレッドセーフなので、並行クロールや複数スパイダーで共有できる。
+    """
+
+    # レートを下げるステータスコード
+    BACKOFF_STATUS_CODES = {403, 429}
+
+    def __init__(
+        self,
+        initial_rate: float = 1 / 1.5,
+        min_rate: float = 0.1,
+        max_rate: float = 4.0,
+        increase_step: float = 0.05,
+        decrease_factor: float = 0.5,
+        burst: float = 1.0,
+    ):
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.burst = burst
+        self._buckets: dict[str, _DomainBucket] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _domain(url: str) -> str:
+        return urlsplit(url).hostname or url
+
+    def _bucket(self, domain: str) -> _DomainBucket:
+        bucket = self._buckets.get(domain)
+        if bucket is None:
+            bucket = _DomainBucket(self.initial_rate, self.burst)
+            self._buckets[domain] = bucket
+        return bucket
+
+    def acquire(self, url: str) -> float:
+        """
+        トークンが取れるまで待機する
+
+        Returns:
+            float: 待機した秒数
+        """
+        domain = self._domain(url)
+        waited = 0.0
+        while True:
+            with self._lock:
+                bucket = self._bucket(domain)
+                now = time.monotonic()
+                bucket.refill(now)
+                wait = bucket.blocked_until - now
+                if bucket.tokens < 1:
+                    wait = max(wait, (1 - bucket.tokens) / bucket.rate)
+                if wait <= 0:
+                    bucket.tokens -= 1
+                    return waited
+            # NOTE: ロックを持ったまま寝ると他ドメインのリクエストまで止まる
+            time.sleep(wait)
+            waited += wait
+
+    def record(
+        self, url: str, status_code: int, retry_after: str | None = None
+    ) -> None:
+        """
+        レスポンスのステータスコードをもとにレートを調整する
+        """
+        domain = self._domain(url)
+        with self._lock:
+            bucket = self._bucket(domain)
+            # NOTE: 304(キャッシュの再検証)も成功として扱う
+            if 200 <= status_code < 300 or status_code == 304:
+                bucket.rate = min(self.max_rate, bucket.rate + self.increase_step)
+                return
+
+            if status_code in self.BACKOFF_STATUS_CODES or 500 <= status_code <= 599:
+                bucket.rate = max(self.min_rate, bucket.rate * self.decrease_factor)
+                # NOTE: 溜まっていたトークンも捨てて、すぐに連続アクセスしないようにする
+                bucket.tokens = 0
+                delay = self._parse_retry_after(retry_after)
+                if delay:
+                    bucket.blocked_until = max(
+                        bucket.blocked_until, time.monotonic() + delay
+                    )
+                logger.info(
+                    f"Backing off {domain} (status {status_code}): "
+                    f"{bucket.rate:.2f} req/s, retry after {delay or 0:.0f}s"
+                )
+
+    def current_rate(self, url_or_domain: str) -> float:
+        """
+        指定ドメインの現在のレート(req/s)を返す
+        """
+        domain = self._domain(url_or_domain) if "/" in url_or_domain else url_or_domain
+        with self._lock:
+            return self._bucket(domain).rate
+
+    def current_rates(self) -> dict[str, float]:
+        """
+        ドメインごとの現在のレート(req/s)を返す
+        """
+        with self._lock:
+            return {domain: bucket.rate for domain, bucket in self._buckets.items()}
+
+    @staticmethod
+    def _parse_retry_after(retry_after: str | None) -> float | None:
+        """
+        Retry-Afterヘッダー(秒数またはHTTP日付)を秒数に変換する
+        """
+        if not retry_after:
+            return None
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            logger.warning(f"Invalid Retry-After header: {retry_after}")
+            return None
+        return max(0.0, retry_at.timestamp() - time.time())
+
+
+# NOTE: 全スパイダーで共有するレートリミッター
+rate_limiter = AdaptiveRateLimiter()
@@ -0,0 +1,79 @@
+import importlib
+import logging
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    from spiders._base_spider import BaseSpider
+
+logger = logging.getLogger(__name__)
+
+# spiders/ディレクトリ(この下の[site_name]/[site_name]_spider.pyをスパイダーとして扱う)
+spiders_dir = Path(__file__).parent
+
+
+class SpiderRegistry:
+    """
+    URLからサイト名、サイト名からスパイダークラスを引くレジストリ
+
+    - ホスト名はurl_mapping.jsonのdomainを辞書で引く(部分一致の線形探索はしない)
+    - スパイダーはspiders/[site_name]/[site_name]_spider.pyから自動で見つける
+      (モジュールは実際にそのサイトを取得するときに初めてimportする)
+    """
+
+    def __init__(self, url_mapping: list[dict]):
+        self.domain_to_site = {
+            mapping["domain"].lower(): mapping["site_name"] for mapping in url_mapping
+        }
+        self._spider_classes: dict[str, "type[BaseSpider] | None"] = {}
+        self._lock = threading.Lock()
+
+    def route(self, url) -> str | None:
+        """
+        URLのホスト名からサイト名を返す(対応するサイトがなければNone)
+
+        NOTE: サブドメイン(page.auctions.yahoo.co.jpなど)は親ドメインで引き直す
+        """
+        if not isinstance(url, str):
+            return None
+        host = urlsplit(url.strip()).hostname or ""
+        while host:
+            site_name = self.domain_to_site.get(host)
+            if site_name is not None:
+                return site_name
+            _, _, host = host.partition(".")
+        return None
+
+    def spider_class(self, site_name: str) -> "type[BaseSpider] | None":
+        """
+        サイト名に対応するスパイダークラスを返す(スパイダーがなければNone)
+        """
+        with self._lock:
+            if site_name not in self._spider_classes:
+                self._spider_classes[site_name] = self._import_spider_class(site_name)
+            return self._spider_classes[site_name]
+
+    @staticmethod
+    def _import_spider_class(site_name: str) -> "type[BaseSpider] | None":
+        """
+        spiders/[site_name]/[site_name]_spider.pyからname == site_nameのスパイダーを探す
+        """
+        from spiders._base_spider import BaseSpider
+
+        if not (spiders_dir / site_name / f"{site_name}_spider.py").exists():
+            return None
+        module = importlib.import_module(f"spiders.{site_name}.{site_name}_spider")
+        for value in vars(module).values():
+            if (
+                isinstance(value, type)
+                and issubclass(value, BaseSpider)
+                and value is not BaseSpider
+                and getattr(value, "name", None) == site_name
+            ):
+                return value
+        logger.warning(
+            f"No spider class with name '{site_name}' found in {module.__name__}"
+        )
+        return None
@@ -0,0 +1,125 @@
+import time
+import functools
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 再試行しても結果が変わらないエラー(終了・削除済みの商品)
+PERMANENT_ERRORS = {
+    "Http404NotFoundError",
+    "Http410GoneError",
+    "Http301MovedPermanentlyException",
+    "Http302FoundException",
+}
+
+# 時間をおけば成功する可能性があるエラーと、再試行する理由
+# NOTE: requests/seleniumの例外はクラス名(継承元を含む)で判定し、ここではimportしない
+TRANSIENT_ERRORS = {
+    "Http429TooManyRequestsException": "rate limited (429)",
+    "Http5xxServerError": "server error (5xx)",
+    "Http403AccessDeniedError": "access denied (403), retrying with a fresh session",
+    "Timeout": "request timed out",
+    "TimeoutException": "page load timed out",
+    "TimeoutError": "timed out",
+    "ConnectionError": "connection error",
+}
+
+
+class RetryPolicy:
+    """
+    エラーの種類で再試行するかを決めるポリシー
+
+    - 404/410/301/302(終了・削除済み)は再試行しない
+    - タイムアウト・429・5xxなどの一時的なエラーだけ、指数バックオフで再試行する
+    - 再試行の回数はURLごと(max_attempts)と実行全体(run_budget)の両方で制限する
+    - それ以外のエラー(抽出の失敗など)は何度やっても同じなので再試行しない
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        run_budget: int = 200,
+        wait_min: float = 4.0,
+        wait_max: float = 15.0,
+    ):
+        self.max_attempts = max_attempts
+        self.run_budget = run_budget
+        self.wait_min = wait_min
+        self.wait_max = wait_max
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def call(self, url: str, func, *args, on_retry=None, **kwargs):
+        """
+        funcを実行し、一時的なエラーなら再試行する(最後のエラーはそのまま投げる)
+
+        on_retryが指定されていれば、再試行の前に(url, 理由, 待機秒数)で呼ぶ
+        """
+        attempt = 1
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                reason = self.retry_reason(e)
+                if reason is None:
+                    raise
+                if attempt >= self.max_attempts:
+                    logger.warning(
+                        f"Giving up {url} after {attempt} attempts: {reason}"
+                    )
+                    raise
+                if not self._consume_budget():
+                    logger.warning(
+                        f"Retry budget for this run ({self.run_budget}) is exhausted. "
+                        f"Not retrying {url}: {reason}"
+                    )
+                    raise
+                wait = min(self.wait_max, self.wait_min * 2 ** (attempt - 1))
+                attempt += 1
+                logger.info(
+                    f"Retrying {url} in {wait:.0f}s (attempt {attempt}/{self.max_attempts}): {reason}"
+                )
+                if on_retry is not None:
+                    on_retry(url, reason, wait)
+                time.sleep(wait)
+
+    @staticmethod
+    def retry_reason(error: Exception) -> str | None:
+        """
+        再試行する場合はその理由を、再試行しない場合はNoneを返す
+        """
+        for error_class in type(error).__mro__:
+            if error_class.__name__ in PERMANENT_ERRORS:
+                return None
+            reason = TRANSIENT_ERRORS.get(error_class.__name__)
+            if reason is not None:
+                return reason
+        return None
+
+    def _consume_budget(self) -> bool:
+        with self._lock:
+            if self.retries >= self.run_budget:
+                return False
+            self.retries += 1
+            return True
+
+
+def retry_by_policy(method):
+    """
+    スパイダーのメソッド(第1引数がURL)をself.retry_policyに従って再試行するデコレーター
+
+    再試行の回数と待ち時間はself.metricsに記録する
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, url, *args, **kwargs):
+        return self.retry_policy.call(
+            url, method, self, url, *args, on_retry=self.metrics.record_retry, **kwargs
+        )
+
+    return wrapper
+
+
+# NOTE: 実行全体で再試行の回数を共有するため、全スパイダーで同じインスタンスを使う
+retry_policy = RetryPolicy()
@@ -0,0 +1,376 @@
+import os
+import json
+import time
+import functools
+import threading
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from spiders._item_status import (
+    ERROR_COLUMN,
+    STATUS_ACTIVE,
+    STATUS_ERROR,
+    STATUS_SOLD,
+    item_status,
+)
+
+logger = logging.getLogger(__name__)
+
+# ドメインごとの応答時間のヒストグラムの区切り(秒)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 取得に成功したとみなす状態
+SUCCEEDED_STATUSES = (STATUS_ACTIVE, STATUS_SOLD)
+
+# Prometheusのメトリクス名の接頭辞
+METRIC_PREFIX = "scraper"
+
+
+class RunMetrics:
+    """
+    1回の実行のURLごとのフェーズ別の時間と、ドメインごとの応答時間・転送量を集計する
+
+    - track(site, url)の中で実行した処理は、そのURLの記録として集計する
+      (記録はスレッドごとに持つので、並行クロールでも混ざらない)
+    - フェーズ: rate_limit_wait / fetch(ブラウザはnavigation) / parse / 各_extract_* / retry_wait
+      NOTE: _extract_fieldsから個別の_extract_*を呼ぶ場合など、フェーズは入れ子になることがある
+    - 結果はJSONのサマリーとPrometheusのtextfile形式で書き出す
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._records: dict[tuple[str, str], dict] = {}
+        self._domains: dict[str, dict] = {}
+        # スクレイピング中のスレッド(ident)と、そのスレッドが処理しているURLの記録
+        self._active: dict[int, dict] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track(self, site: str, url: str):
+        """
+        1つのURLのスクレイピング全体を計測する
+        """
+        with self._lock:
+            record = self._records.setdefault(
+                (site, url),
+                {
+                    "site": site,
+                    "url": url,
+                    "status": None,
+                    "error_type": None,
+                    "seconds": 0.0,
+                    "retries": 0,
+                    "phases": {},
+                },
+            )
+        previous = getattr(self._local, "record", None)
+        self._local.record = record
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._active[thread_id] = record
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                record["seconds"] += elapsed
+                if previous is None:
+                    self._active.pop(thread_id, None)
+                else:
+                    self._active[thread_id] = previous
+            self._local.record = previous
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        処理中のURLのフェーズの時間を計測する
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - start)
+
+    def add_phase(self, name: str, seconds: float) -> None:
+        """
+        処理中のURLのフェーズに時間を加える(track外で呼ばれた場合は何もしない)
+        """
+        record = getattr(self._local, "record", None)
+        if record is None:
+            return
+        with self._lock:
+            record["phases"][name] = record["phases"].get(name, 0.0) + seconds
+
+    def record_retry(self, url: str, reason: str, wait: float) -> None:
+        """
+        再試行の回数と、再試行までの待ち時間を記録する(RetryPolicyのon_retry)
+        """
+        record = getattr(self._local, "record", None)
+        if record is not None:
+            with self._lock:
+                record["retries"] += 1
+        self.add_phase("retry_wait", wait)
+
+    def record_fetch(
+        self,
+        url: str,
+        status_code: int,
+        size: int,
+        seconds: float,
+        phase: str = "fetch",
+    ) -> None:
+        """
+        1リクエストのステータス・転送バイト数・応答時間を記録する
+        """
+        self.add_phase(phase, seconds)
+        with self._lock:
+            domain = self._domain_stats(urlsplit(url).hostname or "")
+            domain["requests"] += 1
+            domain["bytes"] += size
+            domain["latencies"].append(seconds)
+            status = str(status_code)
+            domain["statuses"][status] = domain["statuses"].get(status, 0) + 1
+
+    def add_downloaded_bytes(self, size: int) -> None:
+        """
+        処理中のURLのドメインの転送バイト数に加える(ブラウザで計測した転送量など)
+        """
+        record = getattr(self._local, "record", None)
+        if record is None:
+            return
+        with self._lock:
+            self._domain_stats(urlsplit(record["url"]).hostname or "")["bytes"] += size
+
+    def record_item(self, site: str, item: dict) -> None:
+        """
+        出力した結果から、URLの状態(active/sold/ended/error)を記録する
+        """
+        with self._lock:
+            record = self._records.get((site, item.get("original_url")))
+            if record is None:
+                return
+            record["status"] = item_status(item)
+            record["error_type"] = item.get(ERROR_COLUMN)
+
+    def active_sites(self) -> dict[int, str]:
+        """
+        スクレイピング中のスレッド(ident)と、そのスレッドで処理しているサイト名を返す
+        """
+        with self._lock:
+            return {
+                thread_id: record["site"] for thread_id, record in self._active.items()
+            }
+
+    def _domain_stats(self, domain: str) -> dict:
+        # NOTE: ロック内で呼ぶ
+        if domain not in self._domains:
+            self._domains[domain] = {
+                "requests": 0,
+                "bytes": 0,
+                "statuses": {},
+                "latencies": [],
+            }
+        return self._domains[domain]
+
+    def summary(self) -> dict:
+        """
+        サイトごと・ドメインごとの集計と、URLごとの記録を返す
+        """
+        finished_at = time.time()
+        with self._lock:
+            records = [
+                {**record, "phases": dict(record["phases"])}
+                for record in self._records.values()
+            ]
+            domains = {
+                domain: {**stats, "latencies": list(stats["latencies"])}
+                for domain, stats in self._domains.items()
+            }
+
+        sites = {}
+        for record in records:
+            site = sites.setdefault(
+                record["site"],
+                {
+                    "urls": 0,
+                    "statuses": {},
+                    "retries": 0,
+                    "phase_seconds": {},
+                    "seconds": [],
+                },
+            )
+            site["urls"] += 1
+            status = record["status"] or "unknown"
+            site["statuses"][status] = site["statuses"].get(status, 0) + 1
+            site["retries"] += record["retries"]
+            site["seconds"].append(record["seconds"])
+            phase_seconds = site["phase_seconds"]
+            for name, seconds in record["phases"].items():
+                phase_seconds[name] = phase_seconds.get(name, 0.0) + seconds
+        for site in sites.values():
+            succeeded = sum(
+                site["statuses"].get(status, 0) for status in SUCCEEDED_STATUSES
+            )
+            site["succeeded"] = succeeded
+            site["failed"] = site["statuses"].get(STATUS_ERROR, 0)
+            site["success_rate"] = succeeded / site["urls"]
+            site["seconds"] = _distribution(site.pop("seconds"))
+
+        return {
+            "started_at": _isoformat(self.started_at),
+            "finished_at": _isoformat(finished_at),
+            "duration_seconds": finished_at - self.started_at,
+            "sites": sites,
+            "domains": {
+                domain: {
+                    "requests": stats["requests"],
+                    "bytes": stats["bytes"],
+                    "statuses": stats["statuses"],
+                    "latency_seconds": {
+                        **_distribution(stats["latencies"]),
+                        "buckets": _histogram(stats["latencies"]),
+                    },
+                }
+                for domain, stats in domains.items()
+            },
+            "urls": records,
+        }
+
+    def write_json(self, path: Path) -> dict:
+        """
+        実行のサマリーをJSONで書き出す
+        """
+        summary = self.summary()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        logger.info(f"Wrote run metrics to {path}")
+        return summary
+
+    def write_prometheus(self, path: Path, summary: dict | None = None) -> None:
+        """
+        node_exporterのtextfile collectorで読めるPrometheusのテキスト形式で書き出す
+
+        NOTE: 書きかけのファイルを読まれないよう、一時ファイルに書いてから置き換える
+        """
+        summary = summary or self.summary()
+        lines = []
+
+        def metric(name: str, metric_type: str, help_text: str) -> str:
+            full_name = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {metric_type}")
+            return full_name
+
+        name = metric("run_duration_seconds", "gauge", "Wall time of the run.")
+        lines.append(f"{name} {summary['duration_seconds']:.3f}")
+        name = metric(
+            "run_finished_timestamp_seconds", "gauge", "Unix time the run finished."
+        )
+        lines.append(f"{name} {time.time():.0f}")
+
+        name = metric("items_total", "counter", "Scraped URLs by site and status.")
+        for site, stats in summary["sites"].items():
+            for status, count in stats["statuses"].items():
+                lines.append(f'{name}{{site="{site}",status="{status}"}} {count}')
+        name = metric(
+            "success_ratio", "gauge", "Share of URLs scraped successfully (active or sold)."
+        )
+        for site, stats in summary["sites"].items():
+            lines.append(f'{name}{{site="{site}"}} {stats["success_rate"]:.4f}')
+        name = metric("retries_total", "counter", "Retries by site.")
+        for site, stats in summary["sites"].items():
+            lines.append(f'{name}{{site="{site}"}} {stats["retries"]}')
+        name = metric(
+            "phase_seconds_total", "counter", "Time spent per phase, summed over URLs."
+        )
+        for site, stats in summary["sites"].items():
+            for phase, seconds in stats["phase_seconds"].items():
+                lines.append(f'{name}{{site="{site}",phase="{phase}"}} {seconds:.3f}')
+
+        name = metric(
+            "downloaded_bytes_total", "counter", "Bytes downloaded by domain."
+        )
+        for domain, stats in summary["domains"].items():
+            lines.append(f'{name}{{domain="{domain}"}} {stats["bytes"]}')
+        name = metric(
+            "responses_total", "counter", "Responses by domain and status code."
+        )
+        for domain, stats in summary["domains"].items():
+            for status, count in stats["statuses"].items():
+                lines.append(f'{name}{{domain="{domain}",code="{status}"}} {count}')
+        name = metric(
+            "request_duration_seconds", "histogram", "Response time by domain."
+        )
+        for domain, stats in summary["domains"].items():
+            latency = stats["latency_seconds"]
+            for bound, count in latency["buckets"].items():
+                lines.append(f'{name}_bucket{{domain="{domain}",le="{bound}"}} {count}')
+            lines.append(f'{name}_sum{{domain="{domain}"}} {latency["sum"]:.3f}')
+            lines.append(f'{name}_count{{domain="{domain}"}} {latency["count"]}')
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{path.name}.tmp")
+        temp_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        os.replace(temp_path, path)
+        logger.info(f"Wrote Prometheus metrics to {path}")
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).isoformat(timespec="seconds")
+
+
+def _distribution(values: list[float]) -> dict:
+    """
+    件数・合計・p50/p95・最大を返す
+    """
+    if not values:
+        return {"count": 0, "sum": 0.0, "p50": None, "p95": None, "max": None}
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "sum": sum(ordered),
+        "p50": _percentile(ordered, 50),
+        "p95": _percentile(ordered, 95),
+        "max": ordered[-1],
+    }
+
+
+def _percentile(ordered: list[float], q: float) -> float:
+    # NOTE: 最近傍順位法(orderedはソート済み)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def _histogram(values: list[float]) -> dict[str, int]:
+    """
+    Prometheusと同じ累積のヒストグラム(上限 -> その値以下の件数)を返す
+    """
+    buckets = {
+        str(bound): sum(1 for value in values if value <= bound)
+        for bound in LATENCY_BUCKETS
+    }
+    buckets["+Inf"] = len(values)
+    return buckets
+
+
+def timed_phase(method):
+    """
+    スパイダーのメソッドの実行時間を、メソッド名のフェーズとしてself.metricsに記録するデコレーター
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.metrics.phase(method.__name__):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+# NOTE: main.pyから渡されない場合(単体での実行など)は、全スパイダーでこのインスタンスを使う
+run_metrics = RunMetrics()
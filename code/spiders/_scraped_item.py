@@ -0,0 +1,77 @@
+import sys
+from dataclasses import dataclass, fields
+
+# merged_infoにまとめる列(この順番で改行で区切る)
+MERGED_INFO_COLUMNS = ("title", "description", "condition")
+
+
+@dataclass(slots=True)
+class ScrapedItem:
+    """
+    スクレイピング結果の1件(スパイダーが返す値)
+
+    - __slots__で持つので、1件ごとのdictより小さい
+    - merged_info(タイトル・説明文・状態の連結)とtotal_priceは持たず、必要なときに計算する
+      NOTE: merged_infoは説明文などの2つ目のコピーになるため、ジャーナルにも書かず出力時に作る
+    - 発送元の地域や商品の状態など、同じ値が繰り返し出てくる文字列はinternして共有する
+    - status/error_typeはジャーナルのstatus列・error_type列(_item_status)と同じ名前
+    """
+
+    original_url: str
+    image_urls: str | None = None
+    price: int | None = None
+    shipping_fee: int | None = None
+    shipping_region: str | None = None
+    title: str | None = None
+    description: str | None = None
+    condition: str | None = None
+    status: str | None = None
+    error_type: str | None = None
+
+    def __post_init__(self):
+        self.shipping_region = _intern(self.shipping_region)
+        self.condition = _intern(self.condition)
+        self.status = _intern(self.status)
+        self.error_type = _intern(self.error_type)
+
+    @property
+    def total_price(self) -> int | None:
+        if self.price is None or self.shipping_fee is None:
+            return None
+        return self.price + self.shipping_fee
+
+    @property
+    def merged_info(self) -> str | None:
+        return merged_info(
+            {column: getattr(self, column) for column in MERGED_INFO_COLUMNS}
+        )
+
+    def to_dict(self) -> dict:
+        """
+        ジャーナルやストアに書く形(値のない項目は含めない)に変換する
+        """
+        row = {}
+        for field in fields(self):
+            value = getattr(self, field.name)
+            if value is not None:
+                row[field.name] = value
+        total_price = self.total_price
+        if total_price is not None:
+            row["total_price"] = total_price
+        return row
+
+
+def merged_info(item: dict) -> str | None:
+    """
+    タイトル・説明文・状態を改行で区切ってつなげた文字列を返す(どれも無い行はNone)
+    """
+    values = [item.get(column) for column in MERGED_INFO_COLUMNS]
+    if all(value is None for value in values):
+        return None
+    return "\n".join(value or "" for value in values)
+
+
+def _intern(value):
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
@@ -0,0 +1,170 @@
+import threading
+import logging
+from http.cookiejar import LWPCookieJar
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from spiders._rate_limiter import AdaptiveRateLimiter, rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# Cookieなどの実行間で引き継ぐファイルの置き場所
+cache_dir = Path(__file__).parent.parent / ".cache"
+
+
+class SessionManager:
+    """
+    warm-up済みのrequests.Sessionを実行中・実行間で使い回すためのマネージャー
+
+    - 最初の1回だけトップページにアクセスしてCookieを取得する(warm-up)
+    - Cookieはファイルに保存し、次回実行時に読み込む
+    - HTTPAdapterのコネクションプールでkeep-aliveの接続を使い回す
+    - Cookieの期限切れや403を受けたときだけwarm-upし直す
+    """
+
+    # 日本のブラウザを模倣するヘッダー
+    headers = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36",
+        "Accept-Language": "ja,en-US;q=0.9,en;q=0.8",
+        "Content-Language": "ja-JP",
+        "X-Forwarded-For": "126.0.0.1",  # 日本のIPを模倣
+        "Referer": "https://auctions.yahoo.co.jp/",
+        "Origin": "https://auctions.yahoo.co.jp",
+    }
+
+    # 日本の地域設定を示すCookie
+    region_cookies = {
+        "JP_LOCATION": "JP",
+        "locale": "ja_JP",
+        "country": "jp",
+        "language": "ja",
+        "region": "JP",
+    }
+
+    # warm-upのリクエストのタイムアウト(秒。get_sessionで指定しない場合)
+    warmup_timeout = 30.0
+
+    def __init__(
+        self,
+        warmup_url: str = "https://auctions.yahoo.co.jp/",
+        cookie_path: Path | None = cache_dir / "cookies.txt",
+        pool_connections: int = 10,
+        pool_maxsize: int = 16,
+        rate_limiter: AdaptiveRateLimiter | None = None,
+    ):
+        self.warmup_url = warmup_url
+        self.cookie_path = cookie_path
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.rate_limiter = rate_limiter
+        self.warmup_count = 0
+        self._session: requests.Session | None = None
+        self._needs_warmup = True
+        self._lock = threading.Lock()
+
+    def get_session(self, timeout: float | None = None) -> requests.Session:
+        """
+        warm-up済みのセッションを返す(必要なときだけwarm-upする)
+
+        timeoutはwarm-upのリクエストのタイムアウト(秒。省略時はwarmup_timeout)
+        NOTE: warm-upはロックを持ったまま行うため、タイムアウトがないと1つの応答待ちで
+        全スレッドが止まる。タイムアウトした場合は例外をそのまま投げ(RetryPolicyで再試行できる)、
+        次にセッションを使うときにwarm-upし直す
+        """
+        with self._lock:
+            if self._session is None:
+                self._session = self._create_session()
+                self._needs_warmup = not self._has_valid_cookies()
+            elif not self._needs_warmup and not self._has_valid_cookies():
+                logger.info("Session cookies expired.")
+                self._needs_warmup = True
+
+            if self._needs_warmup:
+                self._warmup(self.warmup_timeout if timeout is None else timeout)
+            return self._session
+
+    def invalidate(self) -> None:
+        """
+        Cookieを破棄して、次にセッションを使うときにwarm-upし直す
+        """
+        with self._lock:
+            if self._session is not None:
+                self._session.cookies.clear()
+                self._session.cookies.update(self.region_cookies)
+            self._needs_warmup = True
+
+    def save(self) -> None:
+        """
+        Cookieをファイルに保存する
+        """
+        with self._lock:
+            self._save_cookies()
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        if self.cookie_path is not None and self.cookie_path.exists():
+            try:
+                saved_cookies = LWPCookieJar()
+                saved_cookies.load(self.cookie_path, ignore_discard=True)
+                for cookie in saved_cookies:
+                    session.cookies.set_cookie(cookie)
+                logger.info(f"Loaded session cookies from {self.cookie_path}")
+            except Exception as e:
+                logger.warning(f"Failed to load session cookies: {e}")
+        session.cookies.update(self.region_cookies)
+        return session
+
+    def _warmup(self, timeout: float) -> None:
+        """
+        トップページにアクセスして必要なCookieを取得する
+        """
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(self.warmup_url)
+        res = self._session.get(self.warmup_url, headers=self.headers, timeout=timeout)
+        if self.rate_limiter is not None:
+            self.rate_limiter.record(
+                self.warmup_url, res.status_code, res.headers.get("Retry-After")
+            )
+        self.warmup_count += 1
+        self._needs_warmup = False
+        logger.info(f"Warmed up session ({self.warmup_count} times so far)")
+        self._save_cookies()
+
+    def _has_valid_cookies(self) -> bool:
+        """
+        warm-up先ドメインの期限切れでないCookieが残っているか
+        """
+        host = urlsplit(self.warmup_url).hostname or ""
+        for cookie in self._session.cookies:
+            # NOTE: 地域設定のCookieはドメインなしで入れているので対象外
+            if not cookie.domain or cookie.is_expired():
+                continue
+            if host.endswith(cookie.domain.lstrip(".")):
+                return True
+        return False
+
+    def _save_cookies(self) -> None:
+        if self.cookie_path is None or self._session is None:
+            return
+        saved_cookies = LWPCookieJar()
+        for cookie in self._session.cookies:
+            if cookie.domain:
+                saved_cookies.set_cookie(cookie)
+        try:
+            self.cookie_path.parent.mkdir(parents=True, exist_ok=True)
+            saved_cookies.save(self.cookie_path, ignore_discard=True)
+        except Exception as e:
+            logger.warning(f"Failed to save session cookies: {e}")
+
+
+# NOTE: 全スパイダーで共有するセッションマネージャー
+session_manager = SessionManager(rate_limiter=rate_limiter)
@@ -1,14 +1,24 @@
 from spiders._base_spider import BaseSpider
 from selenium.webdriver.common.by import By
 import time
+import queue
 import logging
+import threading
 from selenium.webdriver.support.ui import WebDriverWait
 
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.remote.webelement import WebElement
-from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    TimeoutException,
+    WebDriverException,
+)
 import re
-from tenacity import retry, stop_after_attempt, wait_exponential
+from spiders._retry import retry_by_policy
+from spiders._run_metrics import timed_phase
+from spiders._item_status import STATUS_SOLD
+from spiders._scraped_item import ScrapedItem
+from exeptions.expeptions import Http404NotFoundError
 
 # ロギングの基本設定を追加
 logging.basicConfig(
@@ -17,49 +27,275 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# NOTE: 1回のexecute_scriptで全項目を取得するスクリプト(arguments[0]はページタイプ)
+# XPathは_extract_detail_tableなどの個別メソッドと同じものを使う
+EXTRACT_FIELDS_SCRIPT = """
+const pageType = arguments[0];
+const firstNode = (xpath, context) =>
+    document.evaluate(
+        xpath, context || document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+    ).singleNodeValue;
+const textOf = (node) => (node ? node.textContent.trim() : null);
+
+const detailTable = firstNode(
+    './/h2[contains(text(),"商品の情報")]/ancestor::node()/ancestor::node()/following-sibling::node()'
+);
+const detailValue = (label) =>
+    detailTable
+        ? textOf(firstNode(`.//*[contains(text(),"${label}")]/ancestor::node()/following-sibling::node()`, detailTable))
+        : null;
+
+// NOTE: Resource Timingから転送バイト数と読み込み時間を集計する
+// (Timing-Allow-Originの無いクロスオリジンのリソースは0バイトとして数えられる)
+const pageMetrics = () => {
+    const navigation = performance.getEntriesByType('navigation')[0];
+    const resources = performance.getEntriesByType('resource');
+    return {
+        transfer_bytes: (navigation ? navigation.transferSize : 0)
+            + resources.reduce((total, entry) => total + (entry.transferSize || 0), 0),
+        load_seconds: navigation
+            ? (navigation.domContentLoadedEventEnd - navigation.startTime) / 1000
+            : null,
+        resource_count: resources.length,
+    };
+};
+
+let description = null;
+let imageUrls = [];
+if (pageType === "customer_posting") {
+    const descriptionNode = firstNode("//*[@data-testid='description']");
+    description = descriptionNode ? descriptionNode.innerText : null;
+    imageUrls = Array.from(document.querySelectorAll('.slick-list img'))
+        .map(img => img.getAttribute('src'));
+} else if (pageType === "mercari_shops_posting") {
+    description = textOf(firstNode(
+        '//*[contains(@class,"heading__") and contains(text(),"商品の説明")]/ancestor::*/following-sibling::*'
+    ));
+    imageUrls = Array.from(document.querySelectorAll('[role="region"] .slick-list .slick-track .slick-slide'))
+        .map(slide => slide.querySelector('img'))
+        .filter(img => img !== null)
+        .map(img => img.getAttribute('src'));
+}
+
+return {
+    price: textOf(document.querySelector("[data-testid='price'],[data-testid='product-price']")),
+    title: textOf(document.querySelector("h1[class*=heading__]")),
+    description: description,
+    detail_text: detailTable ? detailTable.innerText : null,
+    condition: detailValue("商品の状態"),
+    shipping: detailValue("配送料の負担"),
+    shipping_region: detailValue("発送元の地域"),
+    image_urls: imageUrls.filter(src => src),
+    sold_out: Array.from(document.querySelectorAll("[data-testid='checkout-button']"))
+        .some(button => button.textContent.includes("売り切れ")),
+    page_metrics: pageMetrics(),
+};
+"""
+
+# 削除済みの商品ページに表示される文言
+ITEM_DELETED_TEXTS = [
+    "この商品は削除されました",
+    "該当する商品は削除されています",
+    "ページが見つかりません",
+]
+
+# NOTE: 価格が表示されたら"item"、削除済みの文言が表示されたら"deleted"を返す(どちらでもなければnull)
+# arguments[0]はITEM_DELETED_TEXTS
+ITEM_STATE_SCRIPT = """
+if (document.querySelector("[data-testid='price'],[data-testid='product-price']")) {
+    return "item";
+}
+const text = document.body ? document.body.innerText : "";
+return arguments[0].some(marker => text.includes(marker)) ? "deleted" : null;
+"""
+
+
+# ページタイプごとの画像URLを取得するスクリプト(srcが空の画像があれば空配列を返す)
+IMG_URLS_SCRIPTS = {
+    "customer_posting": """
+        const images = Array.from(document.querySelectorAll('.slick-list img'));
+        const srcs = images.map(img => img.getAttribute('src'));
+        return srcs.every(src => src) ? srcs : [];
+    """,
+    "mercari_shops_posting": """
+        const slides = document.querySelectorAll('[role="region"] .slick-list .slick-track .slick-slide');
+        const srcs = Array.from(slides)
+            .map(slide => slide.querySelector('img'))
+            .filter(img => img !== null)
+            .map(img => img.getAttribute('src'));
+        return srcs.every(src => src) ? srcs : [];
+    """,
+}
+
+# NOTE: 詳細テーブルが描画され、カルーセルの画像にsrcが入ったら抽出を始める
+CONTENT_READY_SCRIPT = """
+const pageType = arguments[0];
+const detailHeading = document.evaluate(
+    './/h2[contains(text(),"商品の情報")]', document, null,
+    XPathResult.FIRST_ORDERED_NODE_TYPE, null
+).singleNodeValue;
+const selector = pageType === "mercari_shops_posting"
+    ? '[role="region"] .slick-list .slick-track .slick-slide img'
+    : '.slick-list img';
+const images = Array.from(document.querySelectorAll(selector));
+return detailHeading !== null
+    && images.length > 0
+    && images.every(img => img.getAttribute('src'));
+"""
+
 
 class MercariSpider(BaseSpider):
-    def __init__(self, urls):
-        super().__init__(urls)
+    name = "mercari"
+    browser_profile = "tuned"
+    # NOTE: クエリ付きのURLや/products/形式のショップURLも商品IDで同じ商品とみなす
+    item_url_patterns = [
+        (re.compile(r"/item/(m\d+)"), "https://jp.mercari.com/item/{}"),
+        (
+            re.compile(r"/(?:shops/product|products)/([A-Za-z0-9]+)"),
+            "https://jp.mercari.com/shops/product/{}",
+        ),
+    ]
+    # 並行に動かすブラウザ(ワーカー)の数
+    workers = 2
+    # 1つのブラウザで処理するページ数の上限(超えたら起動し直す)
+    pages_per_driver = 50
+    # 1ページにかける時間の上限(秒)。読み込み待ちはすべてこの範囲で行う
+    page_time_budget = 20.0
+
+    def __init__(
+        self,
+        urls,
+        workers: int | None = None,
+        pages_per_driver: int | None = None,
+        page_time_budget: float | None = None,
+        **kwargs,
+    ):
+        super().__init__(urls, **kwargs)
+        if workers is not None:
+            self.workers = workers
+        if pages_per_driver is not None:
+            self.pages_per_driver = pages_per_driver
+        if page_time_budget is not None:
+            self.page_time_budget = page_time_budget
+        # NOTE: ワーカーごとに別のブラウザを使うため、driverはスレッドごとに持つ
+        self._local = threading.local()
+        # ページ読み込みの計測値(転送バイト数・読み込み秒数)と待機・抽出秒数の合計
+        self._page_metrics = {
+            "pages": 0,
+            "transfer_bytes": 0,
+            "load_seconds": 0.0,
+            "wait_seconds": 0.0,
+            "extract_seconds": 0.0,
+        }
+        self._page_metrics_lock = threading.Lock()
 
-    def run(self):
-        self.driver = self._load_selenium()
-        scraped_data = self.crawl_urls()
-        return scraped_data
+    @property
+    def driver(self) -> WebDriver | None:
+        return getattr(self._local, "driver", None)
+
+    @driver.setter
+    def driver(self, driver: WebDriver | None) -> None:
+        self._local.driver = driver
 
     def crawl_urls(self):
-        scraped_data = []
+        """
+        URLキューを共有するブラウザのワーカープールでスクレイピングする
+
+        結果は入力順に並べて返す
+        """
         total_urls = len(self.urls)
+        url_queue: queue.Queue = queue.Queue()
         for i, url in enumerate(self.urls, 1):
-            try:
-                logger.info(
-                    f"Scraping URL {i}/{total_urls} ({i/total_urls*100:.1f}%): {url}"
-                )
-                scraped_data.append(self._scrape(url))
-                logger.info(
-                    f"Successfully scraped URL {i}/{total_urls} ({i/total_urls*100:.1f}%)"
-                )
-            except Exception as e:
-                scraped_data.append(
-                    {
-                        "original_url": url,
-                    }
-                )
-                logger.error(
-                    f"Error scraping URL {i}/{total_urls} ({i/total_urls*100:.1f}%): {url} - {e}"
-                )
-                continue
-        if total_urls > 0:
-            success_rate = len(scraped_data) / total_urls * 100
-            logger.info(
-                f"Completed scraping {len(scraped_data)}/{total_urls} URLs ({success_rate:.1f}% success rate)"
-            )
-        else:
-            logger.info(
-                f"No URLs to scrape. Completed with {len(scraped_data)} results."
+            url_queue.put((i, url))
+
+        results: list[ScrapedItem | None] = [None] * total_urls
+        worker_count = max(1, min(self.workers, total_urls))
+        threads = [
+            threading.Thread(
+                target=self._crawl_worker,
+                args=(url_queue, results, total_urls),
+                name=f"mercari-worker-{n}",
             )
+            for n in range(worker_count)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # NOTE: on_itemに渡した結果はNoneになっている
+        scraped_data = [item for item in results if item is not None]
+        self._finish_crawl(total_urls)
+        self._log_page_metrics()
         return scraped_data
 
+    def _crawl_worker(
+        self, url_queue: queue.Queue, results: list, total_urls: int
+    ) -> None:
+        """
+        キューが空になるまでURLを取り出してスクレイピングする
+
+        pages_per_driverページごと、またはブラウザが落ちたときにドライバーを作り直す
+        """
+        pages = 0
+        try:
+            while True:
+                try:
+                    i, url = url_queue.get_nowait()
+                except queue.Empty:
+                    return
+
+                try:
+                    if self.driver is None or pages >= self.pages_per_driver:
+                        self._quit_driver()
+                        self.driver = self._load_selenium()
+                        self.driver.set_page_load_timeout(self.page_time_budget)
+                        pages = 0
+
+                    logger.info(
+                        f"Scraping URL {i}/{total_urls} ({i/total_urls*100:.1f}%): {url}"
+                    )
+                    results[i - 1] = self._emit(self._scrape_tracked(url))
+                    logger.info(
+                        f"Successfully scraped URL {i}/{total_urls} ({i/total_urls*100:.1f}%)"
+                    )
+                except Exception as e:
+                    results[i - 1] = self._emit(self._failed_item(url, e))
+                    logger.error(
+                        f"Error scraping URL {i}/{total_urls} ({i/total_urls*100:.1f}%): {url} - {e}"
+                    )
+                    if not self._is_driver_alive():
+                        logger.warning("Browser crashed. Restarting driver.")
+                        self._quit_driver()
+                finally:
+                    pages += 1
+        finally:
+            self._quit_driver()
+
+    def _is_driver_alive(self) -> bool:
+        """
+        ブラウザがまだ応答するかを確認する
+        """
+        if self.driver is None:
+            return False
+        try:
+            self.driver.current_url
+            return True
+        except WebDriverException:
+            return False
+
+    def _quit_driver(self) -> None:
+        """
+        このワーカーのブラウザを終了する
+        """
+        if self.driver is None:
+            return
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logger.warning(f"Failed to quit driver: {e}")
+        self.driver = None
+
     def determine_page_type(self, url: str) -> str:
         """
         商品のURLに基づいてページタイプを決定します。
@@ -79,87 +315,221 @@ class MercariSpider(BaseSpider):
         logger.error(f"Unknown page type for URL: {url}")
         return "customer_posting"
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=15),
-        reraise=True,
-    )
+    @retry_by_policy
     def _scrape(self, url: str):
+        self.metrics.add_phase("rate_limit_wait", self.rate_limiter.acquire(url))
+        started_at = time.monotonic()
+        deadline = started_at + self.page_time_budget
+
         self.driver.get(url)
-        self.driver.implicitly_wait(5)
+        page_state = WebDriverWait(self.driver, self._remaining(deadline)).until(
+            lambda driver: driver.execute_script(ITEM_STATE_SCRIPT, ITEM_DELETED_TEXTS)
+        )
 
-        wait = WebDriverWait(self.driver, 10)
-        wait.until(
-            EC.presence_of_element_located(
-                (By.CSS_SELECTOR, "[data-testid='price'],[data-testid='product-price']")
-            )
+        # NOTE: WebDriverではステータスコードが取れないため、表示できたら成功として扱う
+        # (転送バイト数は抽出時にResource Timingから加える)
+        self.rate_limiter.record(url, 200)
+        self.metrics.record_fetch(
+            url,
+            404 if page_state == "deleted" else 200,
+            0,
+            time.monotonic() - started_at,
+            phase="navigation",
         )
+        if page_state == "deleted":
+            # NOTE: 削除済みの商品は再試行せず、ネガティブキャッシュに記録させる
+            raise Http404NotFoundError(url)
 
         page_type = self.determine_page_type(url)
 
+        try:
+            with self.metrics.phase("content_wait"):
+                WebDriverWait(
+                    self.driver, self._remaining(deadline), poll_frequency=0.2
+                ).until(
+                    lambda driver: driver.execute_script(CONTENT_READY_SCRIPT, page_type)
+                )
+        except TimeoutException:
+            # NOTE: 画像やテーブルが無いページもあるため、そのまま抽出して個別の補完に任せる
+            logger.warning(f"Page content was not ready within the time budget: {url}")
+        ready_at = time.monotonic()
+
+        fields = self._extract_fields(page_type, deadline)
+
+        wait_seconds = ready_at - started_at
+        extract_seconds = time.monotonic() - ready_at
+        self._record_page_timings(wait_seconds, extract_seconds)
+        logger.info(
+            f"Page timings: wait {wait_seconds:.2f}s, extract {extract_seconds:.2f}s - {url}"
+        )
+
         # A列.商品画像
-        image_urls = self._extract_img_urls(page_type)
+        image_urls = fields["image_urls"]
 
         # B列.URLはそのままurlを使う
 
         # C列.商品価格
-        price = int(
-            re.sub(
-                r"\D",
-                "",
-                self.driver.find_element(
-                    By.CSS_SELECTOR,
-                    "[data-testid='price'],[data-testid='product-price']",
-                )
-                .get_attribute("textContent")
-                .strip(),
-            )
-        )
+        price = fields["price"]
 
         # D列.商品タイトル
-        title = (
-            self.driver.find_element(By.CSS_SELECTOR, "h1[class*=heading__]")
-            .get_attribute("textContent")
-            .strip()
-        )
+        title = fields["title"]
 
         # 発送元の地域
-        shipping_region = self._extract_shipping_region()
+        shipping_region = fields["shipping_region"]
 
         # E列.商品説明文
-        description = self._extract_description(page_type)
+        description = fields["description"]
 
         # F列.商品状態説明文
-        condition = self._extract_condition(page_type)
+        condition = fields["condition"]
 
         # G列？
-        shipping = self._extract_shipping()
-
-        # D列目~F列目を改行で区切ってドッキングしたもの
-        merged_info = "\n".join(
-            [
-                title,
-                description,
-                condition,
-            ]
-        )
+        shipping = fields["shipping"]
 
         # TODO 取得日とかをデータに埋め込んでも良いかも
 
-        scraped_data = {
-            "image_urls": image_urls,  # A列.商品画像
-            "original_url": url,  # B列.URL
-            "price": price,  # C列.商品価格
-            "shipping_fee": shipping,  # 追加する？送料
-            "total_price": price + shipping,  # 追加する？送料込みの価格
-            "shipping_region": shipping_region,  # 追加する？発送元の地域
-            "title": title,  # D列.商品タイトル
-            "description": description,  # E列.商品説明文
-            "condition": condition,  # F列.商品状態説明文
-            "merged_info": merged_info,  # H列 D列目~F列目を改行で区切ってドッキングしたもの
-        }
+        # NOTE: 送料込みの価格(total_price)とH列(merged_info: D列目~F列目を改行で区切って
+        # ドッキングしたもの)はScrapedItemが出力時に計算する
+        scraped_data = ScrapedItem(
+            image_urls=image_urls,  # A列.商品画像
+            original_url=url,  # B列.URL
+            price=price,  # C列.商品価格
+            shipping_fee=shipping,  # 追加する？送料
+            shipping_region=shipping_region,  # 追加する？発送元の地域
+            title=title,  # D列.商品タイトル
+            description=description,  # E列.商品説明文
+            condition=condition,  # F列.商品状態説明文
+            status=STATUS_SOLD if fields["sold_out"] else None,
+        )
         return scraped_data
 
+    @timed_phase
+    def _extract_fields(self, page_type: str, deadline: float | None = None) -> dict:
+        """
+        1回のexecute_scriptで全項目を取得する
+
+        スクリプトで取れなかった項目だけ、個別のfind_elementによる抽出で補う
+        """
+        try:
+            raw = self.driver.execute_script(EXTRACT_FIELDS_SCRIPT, page_type) or {}
+        except WebDriverException as e:
+            logger.warning(f"Failed to extract fields with script: {e}")
+            raw = {}
+
+        self._record_page_metrics(raw.get("page_metrics"))
+
+        # NOTE: 詳細テーブルが見つかった場合、テーブル内に無い項目はページに存在しないとみなす
+        has_detail_table = raw.get("detail_text") is not None
+
+        fields = {}
+
+        if raw.get("image_urls"):
+            fields["image_urls"] = "|".join(raw["image_urls"])
+        else:
+            fields["image_urls"] = self._extract_img_urls(
+                page_type,
+                timeout=self._remaining(deadline) if deadline is not None else 5.0,
+            )
+
+        price_text = raw.get("price")
+        if price_text is None:
+            price_text = (
+                self.driver.find_element(
+                    By.CSS_SELECTOR,
+                    "[data-testid='price'],[data-testid='product-price']",
+                )
+                .get_attribute("textContent")
+                .strip()
+            )
+        fields["price"] = int(re.sub(r"\D", "", price_text))
+
+        fields["title"] = raw.get("title")
+        if fields["title"] is None:
+            fields["title"] = (
+                self.driver.find_element(By.CSS_SELECTOR, "h1[class*=heading__]")
+                .get_attribute("textContent")
+                .strip()
+            )
+
+        if has_detail_table:
+            fields["shipping_region"] = raw.get("shipping_region")
+            shipping_text = raw.get("shipping")
+            fields["shipping"] = (
+                self._determine_shipping_fee(shipping_text)
+                if shipping_text is not None
+                else None
+            )
+        else:
+            fields["shipping_region"] = self._extract_shipping_region()
+            fields["shipping"] = self._extract_shipping()
+
+        if has_detail_table and raw.get("description") is not None:
+            fields["description"] = f"{raw['description']}|{raw['detail_text']}"
+        else:
+            fields["description"] = self._extract_description(page_type)
+
+        if has_detail_table and raw.get("condition") is not None:
+            fields["condition"] = raw["condition"]
+        else:
+            fields["condition"] = self._extract_condition(page_type)
+
+        fields["sold_out"] = bool(raw.get("sold_out"))
+
+        return fields
+
+    @staticmethod
+    def _remaining(deadline: float) -> float:
+        """
+        ページの時間予算の残り秒数を返す
+        """
+        return max(0.0, deadline - time.monotonic())
+
+    def _record_page_timings(self, wait_seconds: float, extract_seconds: float) -> None:
+        """
+        待機と抽出にかかった秒数を合計に加える
+        """
+        with self._page_metrics_lock:
+            self._page_metrics["wait_seconds"] += wait_seconds
+            self._page_metrics["extract_seconds"] += extract_seconds
+
+    def _record_page_metrics(self, metrics: dict | None) -> None:
+        """
+        ページ読み込みの計測値を合計に加える
+        """
+        if not metrics:
+            return
+        self.metrics.add_downloaded_bytes(metrics.get("transfer_bytes") or 0)
+        with self._page_metrics_lock:
+            self._page_metrics["pages"] += 1
+            self._page_metrics["transfer_bytes"] += metrics.get("transfer_bytes") or 0
+            self._page_metrics["load_seconds"] += metrics.get("load_seconds") or 0.0
+
+    def _log_page_metrics(self) -> None:
+        """
+        1ページあたりの平均転送量と読み込み時間、待機・抽出時間をログに出力する
+        """
+        logger.info(
+            f"Time spent: waiting {self._page_metrics['wait_seconds']:.1f}s, "
+            f"extracting {self._page_metrics['extract_seconds']:.1f}s"
+        )
+        pages = self._page_metrics["pages"]
+        if pages == 0:
+            return
+        logger.info(
+            f"Page load ({self.browser_profile} profile): "
+            f"{self._page_metrics['transfer_bytes'] / pages / 1024:.0f} KB/page, "
+            f"{self._page_metrics['load_seconds'] / pages:.2f} s/page (DOMContentLoaded) "
+            f"over {pages} pages"
+        )
+
+    @staticmethod
+    def _determine_shipping_fee(text: str) -> int:
+        """
+        送料込みなら0、送料別なら2000(福岡想定)で固定
+        """
+        return 0 if "送料込み" in text else 2000
+
+    @timed_phase
     def _extract_condition(self, page_type):
         """
         商品のconditionを抽出(詳細ページ)
@@ -176,18 +546,12 @@ class MercariSpider(BaseSpider):
 
         return condition
 
+    @timed_phase
     def _extract_shipping(self):
         """
         Extracts shipping information.
         """
 
-        def determine_shipping_from_text(text: str) -> str:
-            """
-            送料込みなら0、送料別なら2000(福岡想定)で固定
-            """
-            is_shipping_fee = 0 if "送料込み" in text else 2000
-            return is_shipping_fee
-
         shipping = None
 
         try:
@@ -198,12 +562,13 @@ class MercariSpider(BaseSpider):
                 .get_attribute("textContent")
                 .strip()
             )
-            shipping = determine_shipping_from_text(shipping_text)
+            shipping = self._determine_shipping_fee(shipping_text)
         except NoSuchElementException:
             return None
 
         return shipping
 
+    @timed_phase
     def _extract_shipping_region(self):
         """
         Extracts shipping information.
@@ -222,74 +587,31 @@ class MercariSpider(BaseSpider):
 
         return shipping_region
 
-    def _extract_img_urls(self, page_type):
+    @timed_phase
+    def _extract_img_urls(self, page_type, timeout: float = 5.0):
         """
         商品の画像URLを抽出(詳細ページ)
+
+        カルーセルの画像にsrcが入るまで、最大timeout秒だけ待つ
         """
+        script = IMG_URLS_SCRIPTS.get(page_type)
         img_urls = []
 
-        if page_type == "customer_posting":
-            # NOTE: 安定性向上のためリトライ機構を追加
-            max_attempts = 3
-            for attempt in range(max_attempts):
-                try:
-                    # NOTE: ページが完全に読み込まれるまで待機
-                    time.sleep(2)
-
-                    # NOTE: JavaScriptを直接実行して画像URLを抽出（より安定した方法）
-                    img_urls = self.driver.execute_script(
-                        """
-                            const images = document.querySelectorAll('.slick-list img');
-                            return Array.from(images).map(img => img.getAttribute('src'));
-                        """
-                    )
-
-                    if img_urls and len(img_urls) > 0:
-                        break
-                except Exception as e:
-                    if attempt == max_attempts - 1:
-                        logger.warning(f"Failed to extract image URLs: {e}")
-                    else:
-                        time.sleep(1)  # 再試行前に少し待機
-
-                # NOTE: 最終手段（前の試行が失敗した場合）
-                if not img_urls:
-                    try:
-                        # 直接XPATHでの取得を試みる
-                        WebDriverWait(self.driver, 10).until(
-                            EC.presence_of_all_elements_located(
-                                (By.XPATH, '//div[@class="slick-list"]//img')
-                            )
-                        )
-                        img_elements = self.driver.find_elements(
-                            By.XPATH, '//div[@class="slick-list"]//img'
-                        )
-                        img_urls = [
-                            element.get_attribute("src") for element in img_elements
-                        ]
-                    except:
-                        pass
-
-        elif page_type == "mercari_shops_posting":
+        if script is not None:
             try:
-                # NOTE: JavaScriptを使用して直接画像URLを抽出
-                img_urls = self.driver.execute_script(
-                    """
-                        const slides = document.querySelectorAll('[role="region"] .slick-list .slick-track .slick-slide');
-                        return Array.from(slides)
-                            .map(slide => slide.querySelector('img'))
-                            .filter(img => img !== null)
-                            .map(img => img.getAttribute('src'));
-                    """
-                )
+                img_urls = WebDriverWait(
+                    self.driver, max(timeout, 0), poll_frequency=0.2
+                ).until(lambda driver: driver.execute_script(script))
+            except TimeoutException:
+                logger.warning(f"Image URLs were not populated within {timeout:.1f}s")
             except Exception as e:
-                logger.warning(f"Failed to extract Mercari Shops image URLs: {e}")
-                img_urls = []
+                logger.warning(f"Failed to extract image URLs: {e}")
 
         # img_urlsを|で区切る
         img_urls = "|".join(img_urls)
         return img_urls
 
+    @timed_phase
     def _extract_detail_table(self) -> WebElement:
         """
         商品詳細ページの「商品の詳細」テーブルのelementを取得して返す。
@@ -302,6 +624,7 @@ class MercariSpider(BaseSpider):
             './/h2[contains(text(),"商品の情報")]/ancestor::node()/ancestor::node()/following-sibling::node()',
         )
 
+    @timed_phase
     def _extract_description(self, page_type):
         """
         商品詳細情報を抽出(詳細ページ)
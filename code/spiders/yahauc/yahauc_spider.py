@@ -6,7 +6,10 @@ import re
 import json
 import os
 from pathlib import Path
-from tenacity import retry, stop_after_attempt, wait_exponential
+from spiders._retry import retry_by_policy
+from spiders._run_metrics import timed_phase
+from spiders._scraped_item import ScrapedItem
+from exeptions.expeptions import Http403AccessDeniedError
 
 # ロギングの基本設定を追加
 logging.basicConfig(
@@ -21,112 +24,190 @@ current_dir = Path(__file__).parent
 
 class YahaucSpider(BaseSpider):
     name = "yahauc"
-
-    def __init__(self, urls):
-        super().__init__(urls)
-
-    def run(self):
-        scraped_data = self.crawl_urls()
-        return scraped_data
-
-    def crawl_urls(self):
-        scraped_data = []
-        total_urls = len(self.urls)
-        for i, url in enumerate(self.urls, 1):
-            try:
-                logger.info(
-                    f"Scraping URL {i}/{total_urls} ({i/total_urls*100:.1f}%): {url}"
-                )
-                scraped_data.append(self._scrape(url))
-                logger.info(
-                    f"Successfully scraped URL {i}/{total_urls} ({i/total_urls*100:.1f}%)"
-                )
-            except Exception as e:
-                scraped_data.append(
-                    {
-                        "original_url": url,
-                    }
-                )
-                logger.error(
-                    f"Error scraping URL {i}/{total_urls} ({i/total_urls*100:.1f}%): {url} - {e}"
-                )
-                continue
-        if total_urls > 0:
-            success_rate = len(scraped_data) / total_urls * 100
-            logger.info(
-                f"Completed scraping {len(scraped_data)}/{total_urls} URLs ({success_rate:.1f}% success rate)"
-            )
-        else:
-            logger.info(
-                f"No URLs to scrape. Completed with {len(scraped_data)} results."
-            )
-        return scraped_data
-
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=15),
-        reraise=True,
-    )
+    # NOTE: HTTPのみで完結するため並行クロールをデフォルトにする
+    crawl_mode = "async"
+    # 抽出モード("next_data": __NEXT_DATA__から抽出, "dom": BeautifulSoupのセレクタで抽出)
+    extract_mode = "next_data"
+    # NOTE: 入札で価格が動くため、前回の結果を使うのは6時間まで
+    freshness_window = 6 * 60 * 60
+    # NOTE: page.auctions.yahoo.co.jpやクエリ付きのURLもオークションIDで同じ商品とみなす
+    item_url_patterns = [
+        (
+            re.compile(r"auctions\.yahoo\.co\.jp/jp/auction/([A-Za-z]?\d+)"),
+            "https://auctions.yahoo.co.jp/jp/auction/{}",
+        ),
+    ]
+
+    def __init__(self, urls, extract_mode: str | None = None, **kwargs):
+        super().__init__(urls, **kwargs)
+        if extract_mode is not None:
+            self.extract_mode = extract_mode
+
+    @retry_by_policy
     def _scrape(self, url):
+        # NOTE: 終了したオークションはリダイレクトされることがあるため、リダイレクトは追わずに
+        # 301/302として終了・削除済み(再試行しない・ネガティブキャッシュする)にする
         try:
-            soup = self._get_html(url)
-        except Exception as e:
+            content = self._fetch(url, allow_redirects=False)
+        except Http403AccessDeniedError as e:
+            # NOTE: Cookieが弾かれた場合だけ、warm-upし直したセッションで取り直す
+            # (429/5xx/タイムアウトはそのままretry_by_policyに任せる)
             logger.error(f"Error scraping URL {url}: {e}")
-            try:
-                soup = self._session_sp_request(url)
-            except Exception as e:
-                raise e
+            content = self._session_sp_fetch(url, allow_redirects=False)
+
+        if self.extract_mode == "next_data":
+            fields = self._extract_fields_from_next_data(content)
+        else:
+            fields = self._extract_fields_from_dom(self._parse_html(content))
 
         # A列.商品画像
-        image_urls = self._extract_img_urls(soup)
+        image_urls = fields["image_urls"]
 
         # B列.URLはそのままurlを使う
 
         # C列.商品価格
-        price = self._extract_price(soup)
+        price = fields["price"]
 
         # 送料
-        shipping_fee = self._extract_shipping_fee(soup)
+        shipping_fee = fields["shipping_fee"]
 
         # 発送元の地域
-        shipping_region = self._extract_shipping_region(soup)
+        shipping_region = fields["shipping_region"]
 
         # D列.商品タイトル
-        title = soup.select_one("#itemTitle").text
+        title = fields["title"]
 
         # E列.商品説明文
-        description = self._extract_description(soup)
+        description = fields["description"]
 
         # F列.商品状態説明文
-        condition = self._extract_condition(soup)
+        condition = fields["condition"]
 
         # G列？
 
-        # D列目~F列目を改行で区切ってドッキングしたもの
-        merged_info = "\n".join(
-            [
-                title,
-                description,
-                condition,
-            ]
+        # TODO 取得日とかをデータに埋め込んでも良いかも
+
+        # NOTE: 送料込みの価格(total_price)とH列(merged_info: D列目~F列目を改行で区切って
+        # ドッキングしたもの)はScrapedItemが出力時に計算する
+        scraped_data = ScrapedItem(
+            image_urls=image_urls,  # A列.商品画像
+            original_url=url,  # B列.URL
+            price=price,  # C列.商品価格
+            shipping_fee=shipping_fee,  # 追加する？送料
+            shipping_region=shipping_region,  # 追加する？発送元の地域
+            title=title,  # D列.商品タイトル
+            description=description,  # E列.商品説明文
+            condition=condition,  # F列.商品状態説明文
         )
+        return scraped_data
 
-        # TODO 取得日とかをデータに埋め込んでも良いかも
+    def _dom_field_extractors(self) -> dict:
+        """
+        項目名とDOMから抽出するメソッドの対応を返す
+        """
+        return {
+            "image_urls": self._extract_img_urls,
+            "price": self._extract_price,
+            "shipping_fee": self._extract_shipping_fee,
+            "shipping_region": self._extract_shipping_region,
+            "title": self._extract_title,
+            "description": self._extract_description,
+            "condition": self._extract_condition,
+        }
 
-        scraped_data = {
-            "image_urls": image_urls,  # A列.商品画像
-            "original_url": url,  # B列.URL
-            "price": price,  # C列.商品価格
-            "shipping_fee": shipping_fee,  # 追加する？送料
-            "total_price": price + shipping_fee,  # 追加する？送料込みの価格
-            "shipping_region": shipping_region,  # 追加する？発送元の地域
-            "title": title,  # D列.商品タイトル
-            "description": description,  # E列.商品説明文
-            "condition": condition,  # F列.商品状態説明文
-            "merged_info": merged_info,  # H列 D列目~F列目を改行で区切ってドッキングしたもの
+    def _extract_fields_from_dom(self, soup: bs) -> dict:
+        """
+        全項目をDOMのセレクタで抽出する
+        """
+        return {
+            field: extractor(soup)
+            for field, extractor in self._dom_field_extractors().items()
         }
-        return scraped_data
 
+    @timed_phase
+    def _extract_fields_from_next_data(self, content: bytes) -> dict:
+        """
+        __NEXT_DATA__を1回だけデコードして全項目を抽出する
+
+        JSONに無い項目だけ、BeautifulSoupでパースしてDOMのセレクタで補う
+        """
+        detail = self._load_next_data_detail(content)
+        fields = self._fields_from_detail(detail) if detail is not None else {}
+
+        missing = [
+            field
+            for field in self._dom_field_extractors()
+            if fields.get(field) is None
+        ]
+        if missing:
+            logger.debug(f"Falling back to DOM for fields: {missing}")
+            soup = self._parse_html(content)
+            extractors = self._dom_field_extractors()
+            for field in missing:
+                fields[field] = extractors[field](soup)
+        return fields
+
+    @staticmethod
+    def _load_next_data_detail(content: bytes) -> Optional[dict]:
+        """
+        レスポンスのbytesから__NEXT_DATA__を切り出し、商品の詳細情報を返す
+        """
+        start = content.find(b'id="__NEXT_DATA__"')
+        if start == -1:
+            return None
+        start = content.find(b">", start) + 1
+        end = content.find(b"</script>", start)
+        try:
+            data = json.loads(content[start:end])
+            return data["props"]["initialState"]["item"]["detail"]
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Failed to load __NEXT_DATA__: {e}")
+            return None
+
+    def _fields_from_detail(self, detail: dict) -> dict:
+        """
+        __NEXT_DATA__の商品詳細情報から各項目を取り出す(無い項目はNone)
+        """
+        fields = {}
+
+        if img := detail.get("img"):
+            # NOTE: DOMの.ProductImage__image/.slick-sliderの画像は原寸とサムネイルの両方
+            img_urls = dict.fromkeys(
+                url
+                for image in img
+                for url in (image.get("image"), image.get("thumbnail"))
+                if url
+            )
+            fields["image_urls"] = "|".join(img_urls)
+
+        if "price" in detail:
+            # NOTE: 即決価格(bidorbuy)が存在する場合は即決価格
+            price = re.sub(r"\D", "", str(detail.get("bidorbuy", detail["price"])))
+            fields["price"] = int(price)
+
+        # NOTE: 出品者負担(seller)なら送料無料
+        if (charge_for_shipping := detail.get("chargeForShipping")) is not None:
+            fields["shipping_fee"] = 0 if charge_for_shipping == "seller" else 2000
+
+        fields["shipping_region"] = (
+            ((detail.get("seller") or {}).get("location") or {}).get("prefecture")
+        )
+        fields["title"] = detail.get("title")
+
+        if (description_html := detail.get("descriptionHtml")) is not None:
+            fields["description"] = self.clean_html_text(description_html)
+
+        fields["condition"] = detail.get("conditionName")
+        return fields
+
+    @timed_phase
+    def _extract_title(self, soup: bs) -> str:
+        """
+        商品タイトルを抽出(詳細ページ)
+        """
+        return soup.select_one("#itemTitle").text
+
+    @timed_phase
     def _extract_shipping_fee(self, soup: bs) -> Optional[int]:
         """
         送料無料なら0、送料有料なら2000（福岡想定）で固定
@@ -139,6 +220,7 @@ class YahaucSpider(BaseSpider):
             return 0
         return 2000
 
+    @timed_phase
     def _extract_shipping_region(self, soup: bs) -> Optional[str]:
         """
         <div id="itemInfo"> 内の dt タグで「発送元の地域」と記載されている要素の
@@ -165,6 +247,7 @@ class YahaucSpider(BaseSpider):
         shipping_fee = soup.select_one("#itemPostage").text
         return shipping_fee
 
+    @timed_phase
     def _extract_img_urls(self, soup: bs):
         img_urls = [
             img.get("src")
@@ -173,6 +256,7 @@ class YahaucSpider(BaseSpider):
         img_urls = "|".join(list(set(img_urls)))
         return img_urls
 
+    @timed_phase
     def _extract_price(self, soup: bs) -> Optional[int]:
         """
         商品価格抽出(一覧ページ)
@@ -196,6 +280,7 @@ class YahaucSpider(BaseSpider):
 
         return int(price)
 
+    @timed_phase
     def _extract_condition(self, soup: bs) -> Optional[str]:
         """
         商品のconditionを抽出(詳細ページ)
@@ -222,6 +307,7 @@ class YahaucSpider(BaseSpider):
 
         return ""
 
+    @timed_phase
     def _extract_description(self, soup: bs) -> Optional[str]:
         """
         商品詳細情報を抽出(詳細ページ)